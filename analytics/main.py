@@ -1,27 +1,66 @@
-import requests
 import uvicorn
+from anyio import to_thread
 from collections import defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import partial
 from fastapi import FastAPI, Request, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from typing import Optional
 
+from src.auth_app import verify_token
+from src.cache_app import cache_chart
 from src.config import (
     PORT,
     WEB_DOMAINS,
-    AUTH_API,
+    THREADPOOL_SIZE,
+    OWNER_STATIONS_IN_LIMIT,
+    FORECAST_MAX_HORIZON,
 )
-from src.forecast_app import forecast
-from src.mongo_app import fetch_transactions, fetch_evse_status, TransactionQueryParams
+from src.forecast_app import forecast, forecast_series, FORECAST_FIELDS
+from src.model_app import energy_forecast_model
+from src.mongo_app import (
+    aggregate_transactions,
+    fetch_transactions,
+    stream_transactions,
+    fetch_evse_status,
+    group_by_hour,
+    group_by_interval,
+    group_by_interval_and_hour,
+    group_by_period,
+    group_by_station,
+    TransactionQueryParams,
+    PERIODS_MS,
+)
+from src.owner_app import get_stamp_watermark
+from src.rollup_app import aggregate_transaction_metrics
+from src.utils import iter_json_array, iter_ndjson
 from src.sql_app import (
     build_query,
     fetch_data,
+    get_owner_station_ids,
     query_stations_list_by_owner,
     SQLQueryParams,
 )
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Handlers are sync and run in the threadpool, since pymongo, PyMySQL
+    # and the auth client block; its size bounds concurrent requests
+    limiter = to_thread.current_default_thread_limiter()
+    limiter.total_tokens = THREADPOOL_SIZE
+    # Load the forecast model before serving rather than on first use;
+    # failures are logged and the load is retried by the forecasts
+    try:
+        energy_forecast_model.refresh()
+    except Exception:
+        pass
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -70,10 +109,9 @@ def get_user_with_permission(request: Request, allowed_roles: tuple):
             status_code=401, detail="Invalid Authorization header format"
         )
 
-    res = requests.post(f"{AUTH_API}/verify", json={"token": token})
-    data = res.json()
-    if res.status_code != 200:
-        raise HTTPException(status_code=res.status_code, detail=data)
+    data, status_code = verify_token(token)
+    if status_code != 200:
+        raise HTTPException(status_code=status_code, detail=data)
     if data["role"] not in allowed_roles:
         raise HTTPException(status_code=403, detail="Permission denied")
     return {
@@ -89,71 +127,92 @@ def require_permission(*allowed_roles):
     return Depends(dependency)
 
 
-def get_transactions(query_in: TransactionQueryParams, user: dict):
+def get_transaction_query(query_in: TransactionQueryParams, user: dict):
     if user.get("role") == "owner":
         # Get list of station IDs for the owner
         owner_id = user.get("user_id")
-        owned_stations = query_stations_list_by_owner(owner_id)
-        # Transform the list of integers into a comma-separated string
-        owned_stations_str = ",".join(map(str, owned_stations))
+        owned_stations = get_owner_station_ids(owner_id)
 
-        # Assign the string to "station_id"
-        query_in["station_id"] = owned_stations_str
+        query_in["station_id"] = owned_stations
+        if len(owned_stations) > OWNER_STATIONS_IN_LIMIT:
+            # Large owners are matched by the owner ID stamped on sessions
+            watermark = get_stamp_watermark(owner_id, owned_stations)
+            if watermark is not None:
+                query_in["owner_id"] = owner_id
+                query_in["owner_watermark"] = watermark
 
-    transactions = fetch_transactions(query_in)
-    return transactions
+    return query_in
 
 
-# Charting functions
-def time_string_to_hours(time_str):
-    try:
-        hours, minutes, seconds = map(int, time_str.split(":"))
-        return hours + minutes / 60 + seconds / 3600
-    except ValueError:
-        return 0  # Return 0 if the time format is incorrect
+def get_transactions(query_in: TransactionQueryParams, user: dict, fields=None):
+    query_in = get_transaction_query(query_in, user)
+    transactions = fetch_transactions(query_in, fields)
+    return transactions
 
 
-def generate_charts(raw_docs):
-    revenue_by_date = defaultdict(float)
-    sessions_by_date = defaultdict(int)
-    utilization_by_date = defaultdict(float)
-    energy_consumption_by_date = defaultdict(float)
-    hour_counts = [0] * 24
+def stream_transactions_response(
+    request: Request, query_in: TransactionQueryParams, user: dict, fields=None
+):
+    """
+    Streams the transactions as they are read from the cursor, as NDJSON
+    when the client accepts it and as a JSON array otherwise.
+    """
+    query_in = get_transaction_query(query_in, user)
+    transactions = stream_transactions(query_in, fields)
+    if "application/x-ndjson" in request.headers.get("Accept", ""):
+        return StreamingResponse(
+            iter_ndjson(transactions), media_type="application/x-ndjson"
+        )
+    return StreamingResponse(
+        iter_json_array(transactions), media_type="application/json"
+    )
 
-    for doc in raw_docs:
-        mongo_timestamp = doc["transaction_date"]
-        timestamp_seconds = mongo_timestamp / 1000.0
-        date = datetime.utcfromtimestamp(timestamp_seconds)
 
-        # Revenue
-        f_date = date.strftime("%Y-%m-%d")
-        revenue_by_date[f_date] += doc["fee"]
-        sessions_by_date[f_date] += 1
+def forecast_energy(query_in, user, resolution=None, horizon=30, group_by=None):
+    """
+    Forecasts the energy consumption of the matching transactions.
 
-        # Utilization Rate
-        charging_time_hours = time_string_to_hours(doc["charging_time"])
-        utilization_by_date[f_date] += charging_time_hours
+    Without a resolution, one point is predicted per session. With one,
+    sessions are resampled to daily or hourly series, for the whole
+    scope or per station, and each series is predicted for the horizon.
+    """
+    if resolution is None:
+        return forecast(get_transactions(query_in, user, FORECAST_FIELDS))
+    if resolution not in PERIODS_MS:
+        raise HTTPException(status_code=400, detail="Invalid resolution")
+    if group_by not in (None, "station"):
+        raise HTTPException(status_code=400, detail="Invalid group_by")
 
-        # Peak Time
-        hour = date.hour
-        hour_counts[hour] += 1
+    query_in = get_transaction_query(query_in, user)
+    stages = group_by_period(resolution, group_by == "station")
+    buckets = aggregate_transactions(query_in, lambda source: stages)
+    return forecast_series(buckets, resolution, horizon)
 
-        # Energy Consumption
-        energy_consumption_by_date[f_date] += doc["energy_consumed_kwh"]
 
-    # Calculate utilization rate as a percentage
-    for date in utilization_by_date:
-        utilization_by_date[date] = (
-            utilization_by_date[date] / 24
-        ) * 100  # Convert to percentage
+# Charting functions
+# Each chart aggregates the matching transactions in MongoDB and only
+# formats the buckets returned by the pipeline.
+def get_utilization_rate(charging_hours):
+    return (charging_hours / 24) * 100  # Convert to percentage
+
+
+def generate_charts(query_in, user):
+    metrics = ["revenue", "sessions_count", "charging_hours", "energy_consumption"]
+    build_stages = partial(group_by_interval_and_hour, "days", metrics)
+    query_in = get_transaction_query(query_in, user)
+    result = aggregate_transaction_metrics(query_in, build_stages, "hourly")
+    buckets = result[0]["by_date"] if result else []
+    hour_counts = [0] * 24
+    for bucket in result[0]["by_hour"] if result else []:
+        hour_counts[bucket["_id"]] = bucket["count"]
 
-    sorted_dates = sorted(revenue_by_date.keys())
+    sorted_dates = [bucket["_id"] for bucket in buckets]
     rev_chart_data = {
         "labels": sorted_dates,
         "datasets": [
             {
                 "label": "Daily Revenue",
-                "data": [revenue_by_date[date] for date in sorted_dates],
+                "data": [bucket["revenue"] for bucket in buckets],
                 "backgroundColor": "rgba(75, 192, 192, 0.6)",
             }
         ],
@@ -164,7 +223,7 @@ def generate_charts(raw_docs):
         "datasets": [
             {
                 "label": "Number of Sessions",
-                "data": [sessions_by_date[date] for date in sorted_dates],
+                "data": [bucket["sessions_count"] for bucket in buckets],
                 "backgroundColor": "rgba(255, 99, 132, 0.6)",
             }
         ],
@@ -180,7 +239,9 @@ def generate_charts(raw_docs):
         "datasets": [
             {
                 "label": "Utilization Rate (%)",
-                "data": [utilization_by_date[date] for date in sorted_dates],
+                "data": [
+                    get_utilization_rate(bucket["charging_hours"]) for bucket in buckets
+                ],
                 "backgroundColor": "rgba(153, 102, 255, 0.6)",
             }
         ],
@@ -191,7 +252,7 @@ def generate_charts(raw_docs):
         "datasets": [
             {
                 "label": "Energy Consumption (kWh)",
-                "data": [energy_consumption_by_date[date] for date in sorted_dates],
+                "data": [bucket["energy_consumption"] for bucket in buckets],
                 "backgroundColor": "rgba(255, 206, 86, 0.6)",
             }
         ],
@@ -208,186 +269,101 @@ def generate_charts(raw_docs):
     return data_pack
 
 
-def generate_chart_revenue_by_time_interval(raw_docs, interval="days"):
-    revenue_by_interval = defaultdict(float)
-
-    for doc in raw_docs:
-        mongo_timestamp = doc["transaction_date"]
-        timestamp_seconds = mongo_timestamp / 1000.0
-        datetime_obj = datetime.utcfromtimestamp(timestamp_seconds)
-
-        # Determine the format based on the interval
-        if interval == "days":
-            formatted_date = datetime_obj.strftime("%Y-%m-%d")
-        elif interval == "months":
-            formatted_date = datetime_obj.strftime("%Y-%m")
-        elif interval == "years":
-            formatted_date = datetime_obj.strftime("%Y")
-        else:
-            raise ValueError(
-                "Invalid interval. Choose from 'days', 'months', or 'years'."
-            )
-
-        # Revenue
-        revenue_by_interval[formatted_date] += doc["fee"]
-
-    sorted_intervals = sorted(revenue_by_interval.keys())
-    rev_chart_data = {
-        "labels": sorted_intervals,
-        "datasets": [
-            {
-                "label": f"Revenue ({interval.capitalize()})",
-                "data": [revenue_by_interval[date] for date in sorted_intervals],
-                "backgroundColor": "rgba(75, 192, 192, 0.6)",
-            }
-        ],
-    }
-
-    return rev_chart_data
-
-
-def generate_chart_session_count_by_time_interval(raw_docs, interval="days"):
-    sessions_by_interval = defaultdict(int)
-
-    for doc in raw_docs:
-        mongo_timestamp = doc["transaction_date"]
-        timestamp_seconds = mongo_timestamp / 1000.0
-        datetime_obj = datetime.utcfromtimestamp(timestamp_seconds)
-
-        if interval == "days":
-            formatted_date = datetime_obj.strftime("%Y-%m-%d")
-        elif interval == "months":
-            formatted_date = datetime_obj.strftime("%Y-%m")
-        elif interval == "years":
-            formatted_date = datetime_obj.strftime("%Y")
-        else:
-            raise ValueError(
-                "Invalid interval. Choose from 'days', 'months', or 'years'."
-            )
-
-        sessions_by_interval[formatted_date] += 1
-
-    sorted_intervals = sorted(sessions_by_interval.keys())
-    sessions_chart_data = {
-        "labels": sorted_intervals,
-        "datasets": [
-            {
-                "label": f"Charging Sessions ({interval.capitalize()})",
-                "data": [
-                    sessions_by_interval[interval] for interval in sorted_intervals
-                ],
-                "backgroundColor": "rgba(255, 99, 132, 0.6)",
-            }
-        ],
-    }
-
-    return sessions_chart_data
-
-
-def generate_chart_energy_consumption_by_time_interval(raw_docs, interval="days"):
-    energy_consumption_by_interval = defaultdict(float)
-
-    for doc in raw_docs:
-        mongo_timestamp = doc["transaction_date"]
-        timestamp_seconds = mongo_timestamp / 1000.0
-        datetime_obj = datetime.utcfromtimestamp(timestamp_seconds)
+# Label, color and summed metric of each chart over time intervals
+TIME_INTERVAL_CHARTS = {
+    "revenue": ("Revenue", "rgba(75, 192, 192, 0.6)", "revenue"),
+    "sessions_count": (
+        "Charging Sessions",
+        "rgba(255, 99, 132, 0.6)",
+        "sessions_count",
+    ),
+    "energy_consumption": (
+        "Energy Consumption (kWh)",
+        "rgba(255, 206, 86, 0.6)",
+        "energy_consumption",
+    ),
+    "utilization_rate": (
+        "Utilization Rate (%)",
+        "rgba(153, 102, 255, 0.6)",
+        "charging_hours",
+    ),
+}
 
-        if interval == "days":
-            formatted_date = datetime_obj.strftime("%Y-%m-%d")
-        elif interval == "months":
-            formatted_date = datetime_obj.strftime("%Y-%m")
-        elif interval == "years":
-            formatted_date = datetime_obj.strftime("%Y")
-        else:
-            raise ValueError(
-                "Invalid interval. Choose from 'days', 'months', or 'years'."
-            )
 
-        energy_consumption_by_interval[formatted_date] += doc["energy_consumed_kwh"]
+def build_time_interval_chart(buckets, chart, interval):
+    label, color, metric = TIME_INTERVAL_CHARTS[chart]
+    data = [bucket[metric] for bucket in buckets]
+    if chart == "utilization_rate":
+        data = [get_utilization_rate(charging_hours) for charging_hours in data]
 
-    sorted_intervals = sorted(energy_consumption_by_interval.keys())
-    energy_consumption_chart_data = {
-        "labels": sorted_intervals,
+    return {
+        "labels": [bucket["_id"] for bucket in buckets],
         "datasets": [
             {
-                "label": f"Energy Consumption (kWh) ({interval.capitalize()})",
-                "data": [
-                    energy_consumption_by_interval[interval]
-                    for interval in sorted_intervals
-                ],
-                "backgroundColor": "rgba(255, 206, 86, 0.6)",
+                "label": f"{label} ({interval.capitalize()})",
+                "data": data,
+                "backgroundColor": color,
             }
         ],
     }
 
-    return energy_consumption_chart_data
 
+def generate_charts_by_time_interval(
+    query_in, user, interval="days", charts=tuple(TIME_INTERVAL_CHARTS)
+):
+    """
+    Generates the charts over time intervals from a single aggregation,
+    summing every metric the charts need in the same pass.
+    """
+    metrics = [TIME_INTERVAL_CHARTS[chart][2] for chart in charts]
+    build_stages = partial(group_by_interval, interval, metrics)
+    query_in = get_transaction_query(query_in, user)
+    buckets = aggregate_transaction_metrics(query_in, build_stages)
+    return {chart: build_time_interval_chart(buckets, chart, interval) for chart in charts}
 
-def generate_chart_utilization_rate_by_time_interval(raw_docs, interval="days"):
-    utilization_by_interval = defaultdict(float)
 
-    for doc in raw_docs:
-        mongo_timestamp = doc["transaction_date"]
-        timestamp_seconds = mongo_timestamp / 1000.0
-        datetime_obj = datetime.utcfromtimestamp(timestamp_seconds)
+def generate_chart_revenue_by_time_interval(query_in, user, interval="days"):
+    charts = generate_charts_by_time_interval(query_in, user, interval, ["revenue"])
+    return charts["revenue"]
 
-        if interval == "days":
-            formatted_date = datetime_obj.strftime("%Y-%m-%d")
-        elif interval == "months":
-            formatted_date = datetime_obj.strftime("%Y-%m")
-        elif interval == "years":
-            formatted_date = datetime_obj.strftime("%Y")
-        else:
-            raise ValueError(
-                "Invalid interval. Choose from 'days', 'months', or 'years'."
-            )
 
-        charging_time_hours = time_string_to_hours(doc["charging_time"])
-        utilization_by_interval[formatted_date] += charging_time_hours
+def generate_chart_session_count_by_time_interval(query_in, user, interval="days"):
+    charts = generate_charts_by_time_interval(
+        query_in, user, interval, ["sessions_count"]
+    )
+    return charts["sessions_count"]
 
-    for formatted_date in utilization_by_interval:
-        utilization_by_interval[formatted_date] = (
-            utilization_by_interval[formatted_date] / 24
-        ) * 100  # Convert to percentage
 
-    sorted_intervals = sorted(utilization_by_interval.keys())
-    utilization_chart_data = {
-        "labels": sorted_intervals,
-        "datasets": [
-            {
-                "label": f"Utilization Rate (%) ({interval.capitalize()})",
-                "data": [
-                    utilization_by_interval[interval] for interval in sorted_intervals
-                ],
-                "backgroundColor": "rgba(153, 102, 255, 0.6)",
-            }
-        ],
-    }
-
-    return utilization_chart_data
+def generate_chart_energy_consumption_by_time_interval(
+    query_in, user, interval="days"
+):
+    charts = generate_charts_by_time_interval(
+        query_in, user, interval, ["energy_consumption"]
+    )
+    return charts["energy_consumption"]
 
 
-def generate_chart_revenue_by_station(raw_docs, count=5, order="desc"):
-    revenue_by_station = defaultdict(float)
+def generate_chart_utilization_rate_by_time_interval(query_in, user, interval="days"):
+    charts = generate_charts_by_time_interval(
+        query_in, user, interval, ["utilization_rate"]
+    )
+    return charts["utilization_rate"]
 
-    for doc in raw_docs:
-        station_id = doc["station_id"]
-        revenue_by_station[station_id] += doc["fee"]
 
-    sorted_stations = sorted(
-        revenue_by_station, key=revenue_by_station.get, reverse=(order == "desc")
-    )
-    sorted_stations = sorted_stations[:count]
+def generate_chart_revenue_by_station(query_in, user, count=5, order="desc"):
+    build_stages = partial(group_by_station, "revenue", count, order)
+    query_in = get_transaction_query(query_in, user)
+    buckets = aggregate_transaction_metrics(query_in, build_stages)
 
     # Construct chart label
     top_or_bottom = "Top" if order == "desc" else "Bottom"
 
     rev_chart_data = {
-        "labels": sorted_stations,
+        "labels": [bucket["_id"] for bucket in buckets],
         "datasets": [
             {
                 "label": f"{top_or_bottom} {count} Stations by Revenue",
-                "data": [revenue_by_station[station] for station in sorted_stations],
+                "data": [bucket["revenue"] for bucket in buckets],
                 "backgroundColor": "rgba(75, 192, 192, 0.6)",
             }
         ],
@@ -396,27 +372,20 @@ def generate_chart_revenue_by_station(raw_docs, count=5, order="desc"):
     return rev_chart_data
 
 
-def generate_chart_session_count_by_station(raw_docs, count=5, order="desc"):
-    sessions_by_station = defaultdict(int)
-
-    for doc in raw_docs:
-        station_id = doc["station_id"]
-        sessions_by_station[station_id] += 1
-
-    sorted_stations = sorted(
-        sessions_by_station, key=sessions_by_station.get, reverse=(order == "desc")
-    )
-    sorted_stations = sorted_stations[:count]
+def generate_chart_session_count_by_station(query_in, user, count=5, order="desc"):
+    build_stages = partial(group_by_station, "sessions_count", count, order)
+    query_in = get_transaction_query(query_in, user)
+    buckets = aggregate_transaction_metrics(query_in, build_stages)
 
     # Construct chart label
     top_or_bottom = "Top" if order == "desc" else "Bottom"
 
     sessions_chart_data = {
-        "labels": sorted_stations,
+        "labels": [bucket["_id"] for bucket in buckets],
         "datasets": [
             {
                 "label": f"{top_or_bottom} {count} Most Visited Stations",
-                "data": [sessions_by_station[station] for station in sorted_stations],
+                "data": [bucket["sessions_count"] for bucket in buckets],
                 "backgroundColor": "rgba(255, 99, 132, 0.6)",
             }
         ],
@@ -425,32 +394,20 @@ def generate_chart_session_count_by_station(raw_docs, count=5, order="desc"):
     return sessions_chart_data
 
 
-def generate_chart_energy_consumption_by_station(raw_docs, count=5, order="desc"):
-    energy_consumption_by_station = defaultdict(float)
-
-    for doc in raw_docs:
-        station_id = doc["station_id"]
-        energy_consumption_by_station[station_id] += doc["energy_consumed_kwh"]
-
-    sorted_stations = sorted(
-        energy_consumption_by_station,
-        key=energy_consumption_by_station.get,
-        reverse=(order == "desc"),
-    )
-    sorted_stations = sorted_stations[:count]
+def generate_chart_energy_consumption_by_station(query_in, user, count=5, order="desc"):
+    build_stages = partial(group_by_station, "energy_consumption", count, order)
+    query_in = get_transaction_query(query_in, user)
+    buckets = aggregate_transaction_metrics(query_in, build_stages)
 
     # Construct chart label
     top_or_bottom = "Top" if order == "desc" else "Bottom"
 
     energy_consumption_chart_data = {
-        "labels": sorted_stations,
+        "labels": [bucket["_id"] for bucket in buckets],
         "datasets": [
             {
                 "label": f"{top_or_bottom} {count} Stations by Energy Consumption (kWh)",
-                "data": [
-                    energy_consumption_by_station[station]
-                    for station in sorted_stations
-                ],
+                "data": [bucket["energy_consumption"] for bucket in buckets],
                 "backgroundColor": "rgba(255, 206, 86, 0.6)",
             }
         ],
@@ -459,36 +416,21 @@ def generate_chart_energy_consumption_by_station(raw_docs, count=5, order="desc"
     return energy_consumption_chart_data
 
 
-def generate_chart_utilization_rate_by_station(raw_docs, count=5, order="desc"):
-    utilization_by_station = defaultdict(float)
-
-    for doc in raw_docs:
-        station_id = doc["station_id"]
-        charging_time_hours = time_string_to_hours(doc["charging_time"])
-        utilization_by_station[station_id] += charging_time_hours
-
-    for station_id in utilization_by_station:
-        utilization_by_station[station_id] = (
-            utilization_by_station[station_id] / 24
-        ) * 100  # Convert to percentage
-
-    sorted_stations = sorted(
-        utilization_by_station,
-        key=utilization_by_station.get,
-        reverse=(order == "desc"),
-    )
-    sorted_stations = sorted_stations[:count]
+def generate_chart_utilization_rate_by_station(query_in, user, count=5, order="desc"):
+    build_stages = partial(group_by_station, "charging_hours", count, order)
+    query_in = get_transaction_query(query_in, user)
+    buckets = aggregate_transaction_metrics(query_in, build_stages)
 
     # Construct chart label
     top_or_bottom = "Top" if order == "desc" else "Bottom"
 
     utilization_chart_data = {
-        "labels": sorted_stations,
+        "labels": [bucket["_id"] for bucket in buckets],
         "datasets": [
             {
                 "label": f"{top_or_bottom} {count} Stations by Utilization Rate (%)",
                 "data": [
-                    utilization_by_station[station] for station in sorted_stations
+                    get_utilization_rate(bucket["charging_hours"]) for bucket in buckets
                 ],
                 "backgroundColor": "rgba(153, 102, 255, 0.6)",
             }
@@ -498,17 +440,12 @@ def generate_chart_utilization_rate_by_station(raw_docs, count=5, order="desc"):
     return utilization_chart_data
 
 
-def generate_chart_peak_time(raw_docs):
+def generate_chart_peak_time(query_in, user):
+    query_in = get_transaction_query(query_in, user)
+    buckets = aggregate_transaction_metrics(query_in, group_by_hour, "hourly")
     hour_counts = [0] * 24
-
-    for doc in raw_docs:
-        mongo_timestamp = doc["transaction_date"]
-        timestamp_seconds = mongo_timestamp / 1000.0
-        date = datetime.utcfromtimestamp(timestamp_seconds)
-
-        # Peak Time
-        hour = date.hour
-        hour_counts[hour] += 1
+    for bucket in buckets:
+        hour_counts[bucket["_id"]] = bucket["count"]
 
     peak_chart_data = {
         "labels": [f"{i}:00 - {i+1}:00" for i in range(24)],
@@ -630,7 +567,7 @@ async def test_mongo_db():
 
 
 @app.get("/api/stations")
-async def get_stations(
+def get_stations(
     owner_id: Optional[int] = None,
     user: dict = require_permission("staff", "owner", "driver"),
 ):
@@ -646,8 +583,22 @@ async def get_stations(
         return {"status": "error", "message": str(e)}
 
 
+@app.post("/api/stations/analytics/owner-stations/refresh")
+def refresh_owner_stations(
+    owner_id: Optional[int] = None,
+    user: dict = require_permission("staff", "owner"),
+):
+    if user.get("role") == "owner":
+        owner_id = user.get("user_id")
+    if owner_id is None:
+        raise HTTPException(status_code=400, detail="owner_id is required")
+    station_ids = get_owner_station_ids(owner_id, refresh=True)
+    return {"owner_id": owner_id, "station_count": len(station_ids)}
+
+
 @app.get("/api/stations/analytics/transactions")
-async def retrieve_transactions(
+def retrieve_transactions(
+    request: Request,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     station_id: Optional[str] = None,
@@ -659,6 +610,7 @@ async def retrieve_transactions(
     state: Optional[str] = None,
     city: Optional[str] = None,
     postal: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     user: dict = require_permission("staff", "owner", "driver"),
 ):
     query_in = TransactionQueryParams(
@@ -675,11 +627,13 @@ async def retrieve_transactions(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    return get_transactions(query_in, user)
+    fields = fields.split(",") if fields else None
+    return stream_transactions_response(request, query_in, user, fields)
 
 
 @app.get("/api/stations/analytics/transactions/{station_id}")
-async def retrieve_transactions_by_station(
+def retrieve_transactions_by_station(
+    request: Request,
     station_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -691,6 +645,7 @@ async def retrieve_transactions_by_station(
     state: Optional[str] = None,
     city: Optional[str] = None,
     postal: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     user: dict = require_permission("staff", "owner", "driver"),
 ):
     query_in = TransactionQueryParams(
@@ -708,11 +663,13 @@ async def retrieve_transactions_by_station(
     )
     query_in = query_in.dict(exclude_none=True)
     # query_in["station_list"] = [station_id]
-    return get_transactions(query_in, user)
+    fields = fields.split(",") if fields else None
+    return stream_transactions_response(request, query_in, user, fields)
 
 
 @app.get("/api/stations/analytics/charts")
-async def generate_charts_from_transactions(
+@cache_chart
+def generate_charts_from_transactions(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     station_id: Optional[str] = None,
@@ -740,15 +697,15 @@ async def generate_charts_from_transactions(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
     # Generate charts from transactions
     if user.get("role") == "driver":
-        return generate_chart_peak_time(transactions)
-    return generate_charts(transactions)
+        return generate_chart_peak_time(query_in, user)
+    return generate_charts(query_in, user)
 
 
 @app.get("/api/stations/analytics/charts/all/{station_id}")
-async def generate_charts_by_station(
+@cache_chart
+def generate_charts_by_station(
     station_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -777,15 +734,14 @@ async def generate_charts_by_station(
     )
     query_in = query_in.dict(exclude_none=True)
     # query_in["station_list"] = [station_id]
-    transactions = get_transactions(query_in, user)
     # Generate charts from transactions
     if user.get("role") == "driver":
-        return generate_chart_peak_time(transactions)
-    return generate_charts(transactions)
+        return generate_chart_peak_time(query_in, user)
+    return generate_charts(query_in, user)
 
 
 @app.get("/api/stations/analytics/evse-status")
-async def retrieve_evse_status(
+def retrieve_evse_status(
     evse_id: Optional[int] = None,
     station_id: Optional[str] = None,
     user: dict = require_permission("staff", "owner", "driver"),
@@ -796,7 +752,7 @@ async def retrieve_evse_status(
 
 
 @app.get("/api/stations/analytics/energy-forecast")
-async def forecast_energy_consumption(
+def forecast_energy_consumption(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     station_id: Optional[str] = None,
@@ -808,6 +764,9 @@ async def forecast_energy_consumption(
     state: Optional[str] = None,
     city: Optional[str] = None,
     postal: Optional[int] = None,
+    resolution: Optional[str] = Query(None, description="Resample sessions to series and predict a fixed horizon", examples=["daily", "hourly"]),
+    horizon: int = Query(30, ge=1, le=FORECAST_MAX_HORIZON, description="Number of periods predicted per series", examples=[7, 30]),
+    group_by: Optional[str] = Query(None, description="Forecast a series per station", examples=["station"]),
     user: dict = require_permission("staff", "owner", "driver"),
 ):
     query_in = TransactionQueryParams(
@@ -824,14 +783,11 @@ async def forecast_energy_consumption(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-
-    transactions = get_transactions(query_in, user)
-    # return transactions
-    return forecast(transactions)
+    return forecast_energy(query_in, user, resolution, horizon, group_by)
 
 
 @app.get("/api/stations/analytics/energy-forecast/{station_id}")
-async def forecast_energy_consumption_by_station(
+def forecast_energy_consumption_by_station(
     station_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -843,6 +799,9 @@ async def forecast_energy_consumption_by_station(
     state: Optional[str] = None,
     city: Optional[str] = None,
     postal: Optional[int] = None,
+    resolution: Optional[str] = Query(None, description="Resample sessions to series and predict a fixed horizon", examples=["daily", "hourly"]),
+    horizon: int = Query(30, ge=1, le=FORECAST_MAX_HORIZON, description="Number of periods predicted per series", examples=[7, 30]),
+    group_by: Optional[str] = Query(None, description="Forecast a series per station", examples=["station"]),
     user: dict = require_permission("staff", "owner", "driver"),
 ):
     query_in = TransactionQueryParams(
@@ -859,10 +818,14 @@ async def forecast_energy_consumption_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
+    return forecast_energy(query_in, user, resolution, horizon, group_by)
 
-    transactions = get_transactions(query_in, user)
-    # return transactions
-    return forecast(transactions)
+
+@app.get("/api/stations/analytics/metrics/models")
+def retrieve_model_metrics(
+    user: dict = require_permission("staff"),
+):
+    return {"energy_forecast": energy_forecast_model.get_metrics()}
 
 
 # Charts
@@ -874,7 +837,8 @@ async def forecast_energy_consumption_by_station(
 
 ### Revenue
 @app.get("/api/stations/analytics/charts/revenue-by-time-interval")
-async def chart_revenue_by_time_interval(
+@cache_chart
+def chart_revenue_by_time_interval(
 
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
@@ -898,13 +862,13 @@ async def chart_revenue_by_time_interval(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_revenue_by_time_interval(transactions, interval)
+    return generate_chart_revenue_by_time_interval(query_in, user, interval)
 
 
 ### Session Count
 @app.get("/api/stations/analytics/charts/session-count-by-time-interval")
-async def chart_session_count_by_time_interval(
+@cache_chart
+def chart_session_count_by_time_interval(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -927,13 +891,13 @@ async def chart_session_count_by_time_interval(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_session_count_by_time_interval(transactions, interval)
+    return generate_chart_session_count_by_time_interval(query_in, user, interval)
 
 
 ### Energy Consumption
 @app.get("/api/stations/analytics/charts/energy-consumption-by-time-interval")
-async def chart_energy_consumption_by_time_interval(
+@cache_chart
+def chart_energy_consumption_by_time_interval(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -956,8 +920,38 @@ async def chart_energy_consumption_by_time_interval(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_energy_consumption_by_time_interval(transactions, interval)
+    return generate_chart_energy_consumption_by_time_interval(query_in, user, interval)
+
+
+### All Metrics
+@app.get("/api/stations/analytics/charts/metrics-by-time-interval")
+@cache_chart
+def chart_metrics_by_time_interval(
+    start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
+    end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
+    country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
+    state: Optional[str] = Query(None, description="Full state name, title case", examples=["California", "New+York"]),
+    city: Optional[str] = Query(None, description="Title case", examples=["Palo+Alto", "Fremont"]),
+    postal: Optional[int] = Query(None, description="Currently only supports US zip codes, as int", examples=[94040, 6001]),
+    user: dict = require_permission("staff", "owner"),
+    interval: str = Query(
+        "days",
+        description="Time interval represented by each unit of the X-axis",
+        examples=["days", "months", "years"],
+    ),
+):
+    query_in = TransactionQueryParams(
+        start_date=start_date,
+        end_date=end_date,
+        country=country,
+        state=state,
+        city=city,
+        postal_code=postal,
+    )
+    query_in = query_in.dict(exclude_none=True)
+    # Utilization rate is left out until its calculation is revisited
+    charts = ["revenue", "sessions_count", "energy_consumption"]
+    return generate_charts_by_time_interval(query_in, user, interval, charts)
 
 
 ### Utilization Rate - Calculation not quite right, need to revisit later
@@ -982,8 +976,7 @@ async def chart_utilization_rate_by_time_interval(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_utilization_rate_by_time_interval(transactions, interval)
+    return generate_chart_utilization_rate_by_time_interval(query_in, user, interval)
 """
 
 ## Metric by station
@@ -992,7 +985,8 @@ async def chart_utilization_rate_by_time_interval(
 
 ### Revenue
 @app.get("/api/stations/analytics/charts/revenue-by-station")
-async def chart_revenue_by_station(
+@cache_chart
+def chart_revenue_by_station(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1001,7 +995,7 @@ async def chart_revenue_by_station(
     postal: Optional[int] = Query(None, description="Currently only supports US zip codes, as int", examples=[94040, 6001]),
     user: dict = require_permission("staff", "owner"),
     count: int = Query(
-        5, description="Number of stations to display", examples=[5, 10, 20]
+        5, ge=1, description="Number of stations to display", examples=[5, 10, 20]
     ),
     order: str = Query(
         "desc", description="Order of stations", examples=["asc", "desc"]
@@ -1016,13 +1010,13 @@ async def chart_revenue_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_revenue_by_station(transactions, count, order)
+    return generate_chart_revenue_by_station(query_in, user, count, order)
 
 
 ### Session Count
 @app.get("/api/stations/analytics/charts/session-count-by-station")
-async def chart_session_count_by_station(
+@cache_chart
+def chart_session_count_by_station(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1031,7 +1025,7 @@ async def chart_session_count_by_station(
     postal: Optional[int] = Query(None, description="Currently only supports US zip codes, as int", examples=[94040, 6001]),
     user: dict = require_permission("staff", "owner"),
     count: int = Query(
-        5, description="Number of stations to display", examples=[5, 10, 20]
+        5, ge=1, description="Number of stations to display", examples=[5, 10, 20]
     ),
     order: str = Query(
         "desc", description="Order of stations", examples=["asc", "desc"]
@@ -1046,13 +1040,13 @@ async def chart_session_count_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_session_count_by_station(transactions, count, order)
+    return generate_chart_session_count_by_station(query_in, user, count, order)
 
 
 ### Energy Consumption
 @app.get("/api/stations/analytics/charts/energy-consumption-by-station")
-async def chart_energy_consumption_by_station(
+@cache_chart
+def chart_energy_consumption_by_station(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1061,7 +1055,7 @@ async def chart_energy_consumption_by_station(
     postal: Optional[int] = Query(None, description="Currently only supports US zip codes, as int", examples=[94040, 6001]),
     user: dict = require_permission("staff", "owner"),
     count: int = Query(
-        5, description="Number of stations to display", examples=[5, 10, 20]
+        5, ge=1, description="Number of stations to display", examples=[5, 10, 20]
     ),
     order: str = Query(
         "desc", description="Order of stations", examples=["asc", "desc"]
@@ -1076,8 +1070,7 @@ async def chart_energy_consumption_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_energy_consumption_by_station(transactions, count, order)
+    return generate_chart_energy_consumption_by_station(query_in, user, count, order)
 
 
 ### Utilization Rate - Calculation not quite right, need to revisit later
@@ -1103,14 +1096,14 @@ async def chart_utilization_rate_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_utilization_rate_by_station(transactions, count, order)
+    return generate_chart_utilization_rate_by_station(query_in, user, count, order)
 """
 
 
 ### Peak Time Chart
 @app.get("/api/stations/analytics/charts/peak-time")
-async def chart_peak_time(
+@cache_chart
+def chart_peak_time(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1128,8 +1121,7 @@ async def chart_peak_time(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_peak_time(transactions)
+    return generate_chart_peak_time(query_in, user)
 
 
 ## Meta Charts
@@ -1232,7 +1224,8 @@ def chart_driver_growth(
 
 ### Revenue
 @app.get("/api/stations/analytics/charts/driver-revenue-by-time-interval")
-async def driver_chart_revenue_by_time_interval(
+@cache_chart
+def driver_chart_revenue_by_time_interval(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1252,12 +1245,12 @@ async def driver_chart_revenue_by_time_interval(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_revenue_by_time_interval(transactions, interval)
+    return generate_chart_revenue_by_time_interval(query_in, user, interval)
 
 ### Session Count
 @app.get("/api/stations/analytics/charts/driver-session-count-by-time-interval")
-async def driver_chart_session_count_by_time_interval(
+@cache_chart
+def driver_chart_session_count_by_time_interval(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1277,12 +1270,12 @@ async def driver_chart_session_count_by_time_interval(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_session_count_by_time_interval(transactions, interval)
+    return generate_chart_session_count_by_time_interval(query_in, user, interval)
 
 ### Energy Consumption
 @app.get("/api/stations/analytics/charts/driver-energy-consumption-by-time-interval")
-async def driver_chart_energy_consumption_by_time_interval(
+@cache_chart
+def driver_chart_energy_consumption_by_time_interval(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1302,15 +1295,15 @@ async def driver_chart_energy_consumption_by_time_interval(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_energy_consumption_by_time_interval(transactions, interval)
+    return generate_chart_energy_consumption_by_time_interval(query_in, user, interval)
 
 ## Metric by station
 ## Options: displayed_stations_count (int), order (asc, desc)
 
 ### Revenue
 @app.get("/api/stations/analytics/charts/driver-revenue-by-station")
-async def driver_chart_revenue_by_station(
+@cache_chart
+def driver_chart_revenue_by_station(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1318,7 +1311,7 @@ async def driver_chart_revenue_by_station(
     city: Optional[str] = Query(None, description="Title case", examples=["Palo+Alto", "Fremont"]),
     postal: Optional[int] = Query(None, description="Currently only supports US zip codes, as int", examples=[94040, 6001]),
     user: dict = require_permission("driver"),
-    count: int = Query(5, description="Number of stations to display", examples=[5, 10, 20]),
+    count: int = Query(5, ge=1, description="Number of stations to display", examples=[5, 10, 20]),
     order: str = Query("desc", description="Order of stations", examples=["asc", "desc"]),
 ):
     query_in = TransactionQueryParams(
@@ -1331,12 +1324,12 @@ async def driver_chart_revenue_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_revenue_by_station(transactions, count, order)
+    return generate_chart_revenue_by_station(query_in, user, count, order)
 
 ### Session Count
 @app.get("/api/stations/analytics/charts/driver-session-count-by-station")
-async def driver_chart_session_count_by_station(
+@cache_chart
+def driver_chart_session_count_by_station(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1344,7 +1337,7 @@ async def driver_chart_session_count_by_station(
     city: Optional[str] = Query(None, description="Title case", examples=["Palo+Alto", "Fremont"]),
     postal: Optional[int] = Query(None, description="Currently only supports US zip codes, as int", examples=[94040, 6001]),
     user: dict = require_permission("driver"),
-    count: int = Query(5, description="Number of stations to display", examples=[5, 10, 20]),
+    count: int = Query(5, ge=1, description="Number of stations to display", examples=[5, 10, 20]),
     order: str = Query("desc", description="Order of stations", examples=["asc", "desc"]),
 ):
     query_in = TransactionQueryParams(
@@ -1357,12 +1350,12 @@ async def driver_chart_session_count_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_session_count_by_station(transactions, count, order)
+    return generate_chart_session_count_by_station(query_in, user, count, order)
 
 ### Energy Consumption
 @app.get("/api/stations/analytics/charts/driver-energy-consumption-by-station")
-async def driver_chart_energy_consumption_by_station(
+@cache_chart
+def driver_chart_energy_consumption_by_station(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
     country: Optional[str] = Query(None, description="Title case", examples=["USA", "Burkina+Faso"]),
@@ -1370,7 +1363,7 @@ async def driver_chart_energy_consumption_by_station(
     city: Optional[str] = Query(None, description="Title case", examples=["Palo+Alto", "Fremont"]),
     postal: Optional[int] = Query(None, description="Currently only supports US zip codes, as int", examples=[94040, 6001]),
     user: dict = require_permission("driver"),
-    count: int = Query(5, description="Number of stations to display", examples=[5, 10, 20]),
+    count: int = Query(5, ge=1, description="Number of stations to display", examples=[5, 10, 20]),
     order: str = Query("desc", description="Order of stations", examples=["asc", "desc"]),
 ):
     query_in = TransactionQueryParams(
@@ -1383,11 +1376,11 @@ async def driver_chart_energy_consumption_by_station(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_energy_consumption_by_station(transactions, count, order)
+    return generate_chart_energy_consumption_by_station(query_in, user, count, order)
 
 @app.get("/api/stations/analytics/charts/peak-time/{station_id}")
-async def driver_chart_peak_time(
+@cache_chart
+def driver_chart_peak_time(
     station_id: str,
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-01-01"]),
     end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD", examples=["2020-12-31"]),
@@ -1407,8 +1400,7 @@ async def driver_chart_peak_time(
         postal_code=postal,
     )
     query_in = query_in.dict(exclude_none=True)
-    transactions = get_transactions(query_in, user)
-    return generate_chart_peak_time(transactions)
+    return generate_chart_peak_time(query_in, user)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=int(PORT), reload=True)
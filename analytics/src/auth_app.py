@@ -0,0 +1,119 @@
+import jwt
+import requests
+import time
+import traceback
+from requests.adapters import HTTPAdapter
+from hashlib import sha256
+from queue import Full, Queue
+from sys import stderr
+from threading import Lock, Thread
+
+from src.config import (
+    AUTH_API,
+    AUTH_JWT_SECRET,
+    AUTH_CACHE_MAXSIZE,
+    AUTH_CACHE_TTL,
+    AUTH_CACHE_NEGATIVE_TTL,
+    THREADPOOL_SIZE,
+)
+from src.utils import TTLCache
+
+# Keep-alive connections to the auth service, one per handler thread
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_maxsize=THREADPOOL_SIZE))
+http.mount("https://", HTTPAdapter(pool_maxsize=THREADPOOL_SIZE))
+
+# Remote verification results keyed by token hash
+token_cache = TTLCache(AUTH_CACHE_MAXSIZE, AUTH_CACHE_TTL)
+
+# Revocation checks run one at a time by a single background thread;
+# tokens are skipped while the queue is full and retried on later use
+revocation_checks = Queue(maxsize=AUTH_CACHE_MAXSIZE)
+revocation_worker = None
+
+# Token hashes with a revocation check queued or in flight
+pending_checks = set()
+pending_checks_lock = Lock()
+
+
+def get_token_expiry(token):
+    try:
+        payload = jwt.decode(token, options={"verify_signature": False})
+        return float(payload["exp"])
+    except Exception:
+        return None
+
+
+def verify_token_remotely(token, key):
+    body = {"token": token}
+    response = http.post(f"{AUTH_API}/verify", json=body)
+    result = (response.json(), response.status_code)
+    if response.status_code == 200:
+        ttl = AUTH_CACHE_TTL
+        expiry = get_token_expiry(token)
+        if expiry:
+            ttl = min(ttl, expiry - time.time())
+        token_cache.set(key, result, ttl)
+    elif response.status_code == 401:
+        token_cache.set(key, result, AUTH_CACHE_NEGATIVE_TTL)
+    return result
+
+
+def check_revocation(token, key):
+    try:
+        verify_token_remotely(token, key)
+    except Exception as error:
+        print(f"RevocationCheckError: {error}", file=stderr)
+        print(traceback.format_exc(), file=stderr)
+    finally:
+        with pending_checks_lock:
+            pending_checks.discard(key)
+
+
+def run_revocation_checks():
+    while True:
+        token, key = revocation_checks.get()
+        check_revocation(token, key)
+
+
+def schedule_revocation_check(token, key):
+    global revocation_worker
+    with pending_checks_lock:
+        if key in pending_checks:
+            return
+        try:
+            revocation_checks.put_nowait((token, key))
+        except Full:
+            return
+        pending_checks.add(key)
+        # Started on first use, and again in forked workers
+        if revocation_worker is None or not revocation_worker.is_alive():
+            revocation_worker = Thread(target=run_revocation_checks, daemon=True)
+            revocation_worker.start()
+
+
+def verify_token_locally(token, key):
+    try:
+        data = jwt.decode(token, AUTH_JWT_SECRET, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        return {"message": "Expired token"}, 401
+    except jwt.InvalidTokenError:
+        return {"message": "Invalid token"}, 401
+
+    # The last remote result stays authoritative until it expires,
+    # after which the token is re-checked in the background
+    cached = token_cache.get(key)
+    if cached:
+        return cached
+    schedule_revocation_check(token, key)
+    return data, 200
+
+
+def verify_token(token):
+    key = sha256(token.encode()).hexdigest()
+    if AUTH_JWT_SECRET:
+        return verify_token_locally(token, key)
+    cached = token_cache.get(key)
+    if cached:
+        return cached
+    return verify_token_remotely(token, key)
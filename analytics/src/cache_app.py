@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from hashlib import sha256
+from sys import stderr
+
+from src.config import (
+    mongo as db,
+    CHART_CACHE_BACKEND,
+    CHART_CACHE_MAXSIZE,
+    CHART_CACHE_TTL,
+    CHART_CACHE_RECENT_TTL,
+    ROLLUP_SETTLE_SECONDS,
+)
+from src.mongo_app import date_to_milliseconds, DEFAULT_END_DATE
+from src.sql_app import get_owner_station_ids
+from src.utils import TTLCache
+
+
+class ChartCache:
+    """
+    Chart results cached in process, and optionally in a MongoDB
+    collection shared by every worker, expired through a TTL index.
+    """
+
+    def __init__(self, maxsize, collection=None):
+        self.local = TTLCache(maxsize, CHART_CACHE_TTL)
+        self.collection = collection
+        if collection is not None:
+            collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None or self.collection is None:
+            return value
+        try:
+            now = datetime.now(timezone.utc)
+            entry = self.collection.find_one({"_id": key, "expires_at": {"$gt": now}})
+        except Exception as e:
+            print(f"ChartCacheError: {e}", file=stderr)
+            return None
+        if not entry:
+            return None
+        expires_at = entry["expires_at"].replace(tzinfo=timezone.utc)
+        ttl = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        self.local.set(key, entry["value"], ttl)
+        return entry["value"]
+
+    def set(self, key, value, ttl):
+        self.local.set(key, value, ttl)
+        if self.collection is None:
+            return
+        try:
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+            self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "value": value, "expires_at": expires_at},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"ChartCacheError: {e}", file=stderr)
+
+
+chart_cache = ChartCache(
+    CHART_CACHE_MAXSIZE,
+    db.chart_cache if CHART_CACHE_BACKEND == "mongo" else None,
+)
+
+
+def get_scope(user):
+    # Owners and drivers only see their own stations and sessions
+    if user.get("role") == "staff":
+        return ["staff"]
+    scope = [user.get("role"), user.get("user_id")]
+    if user.get("role") == "owner":
+        # Charts cached for a former set of stations are not reused
+        station_ids = sorted(get_owner_station_ids(user.get("user_id")))
+        scope.append(sha256(json.dumps(station_ids).encode()).hexdigest())
+    return scope
+
+
+def get_chart_ttl(end_date):
+    """Ranges are closed, and no longer change, once their last day has settled"""
+    end_ms = date_to_milliseconds(end_date or DEFAULT_END_DATE)
+    if end_ms is None:
+        return CHART_CACHE_RECENT_TTL
+    # The end date includes its whole day, and sessions may arrive late
+    closed_at = datetime.fromtimestamp(end_ms / 1000, timezone.utc) + timedelta(
+        days=1, seconds=ROLLUP_SETTLE_SECONDS
+    )
+    if datetime.now(timezone.utc) > closed_at:
+        return CHART_CACHE_TTL
+    return CHART_CACHE_RECENT_TTL
+
+
+def cache_chart(f):
+    """
+    Caches the chart returned by a route, keyed by the route, its
+    normalized parameters and the scope of the user.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, user: dict, **kwargs):
+        params = sorted((name, value) for name, value in kwargs.items() if value is not None)
+        key = json.dumps([f.__name__, params, get_scope(user)], default=str)
+        key = sha256(key.encode()).hexdigest()
+
+        chart = chart_cache.get(key)
+        if chart is None:
+            chart = f(*args, user=user, **kwargs)
+            chart_cache.set(key, chart, get_chart_ttl(kwargs.get("end_date")))
+        return chart
+
+    return decorated_function
@@ -15,7 +15,15 @@ dotenv.load_dotenv(dotenv_path=dotenv_path)
 PORT = os.environ["PORT"]
 WEB_DOMAINS = os.environ["WEB_DOMAINS"].split(",") or "*"
 AUTH_API = os.environ["AUTH_API"]
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", 40))
+AUTH_JWT_SECRET = os.environ.get("AUTH_JWT_SECRET")
+AUTH_CACHE_MAXSIZE = int(os.environ.get("AUTH_CACHE_MAXSIZE", 10000))
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_NEGATIVE_TTL = int(os.environ.get("AUTH_CACHE_NEGATIVE_TTL", 30))
 ENERGY_FORECAST_MODEL_PATH = os.environ["ENERGY_FORECAST_MODEL_PATH"]
+ENERGY_FORECAST_MODEL_MMAP = os.environ.get("ENERGY_FORECAST_MODEL_MMAP", "false") == "true"
+MODEL_CHECK_INTERVAL = int(os.environ.get("MODEL_CHECK_INTERVAL", 30))
+FORECAST_MAX_HORIZON = int(os.environ.get("FORECAST_MAX_HORIZON", 366))
 
 # MySQL Configuration
 MYSQL_URI = os.environ["MYSQL_URI"]
@@ -35,3 +43,20 @@ mysql_pool = PooledDB(
 MONGODB_URI = os.environ["MONGODB_URI"]
 MONGODB_DATABASE = pymongo.uri_parser.parse_uri(MONGODB_URI)["database"]
 mongo = pymongo.MongoClient(MONGODB_URI)[MONGODB_DATABASE]
+TRANSACTION_BATCH_SIZE = int(os.environ.get("TRANSACTION_BATCH_SIZE", 1000))
+
+# Chart Cache
+CHART_CACHE_BACKEND = os.environ.get("CHART_CACHE_BACKEND", "memory")
+CHART_CACHE_MAXSIZE = int(os.environ.get("CHART_CACHE_MAXSIZE", 1000))
+CHART_CACHE_TTL = int(os.environ.get("CHART_CACHE_TTL", 86400))
+CHART_CACHE_RECENT_TTL = int(os.environ.get("CHART_CACHE_RECENT_TTL", 60))
+
+# Owner Station Cache
+OWNER_STATIONS_CACHE_TTL = int(os.environ.get("OWNER_STATIONS_CACHE_TTL", 300))
+OWNER_STATIONS_IN_LIMIT = int(os.environ.get("OWNER_STATIONS_IN_LIMIT", 1000))
+OWNER_STAMP_REFRESH_INTERVAL = int(os.environ.get("OWNER_STAMP_REFRESH_INTERVAL", 300))
+
+# Transaction Rollups
+ROLLUP_ENABLED = os.environ.get("ROLLUP_ENABLED", "true") == "true"
+ROLLUP_REFRESH_INTERVAL = int(os.environ.get("ROLLUP_REFRESH_INTERVAL", 60))
+ROLLUP_SETTLE_SECONDS = int(os.environ.get("ROLLUP_SETTLE_SECONDS", 10))
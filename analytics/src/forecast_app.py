@@ -1,173 +1,211 @@
-import joblib
+import numpy as np
 import pandas as pd
 from scipy import stats
-from sklearn.preprocessing import LabelEncoder
-from xgboost import *
-
-from src.config import ENERGY_FORECAST_MODEL_PATH
-
-
-def map_to_dataframe(data):
-    # Define the mapping of keys to desired column names
-    column_mapping = {
-        "postal_code": "ZipCode",
-        "station_name": "Charging Station",
-        "city": "City",
-        "state": "State",
-        "latitude": "Latitude",
-        "longitude": "Longitude",
-        "start_date": "Start Date",
-        "end_date": "End Date",
-        "total_duration": "Total Duration",
-        "charging_time": "Charging Time",
-        "charge_level": "Charging Port Type",
-        "evse_number": "Charging Ports",
-        "plug_type": "Plug Type",
-        "energy_consumed_kwh": "Energy Consumed",
-        "fee": "Charges",
-    }
-
-    # Filter the data to only include the keys in column_mapping
-    filtered_data = [
-        {key: item[key] for key in column_mapping if key in item} for item in data
-    ]
-
-    # Create a DataFrame from the filtered list of dictionaries
-    df = pd.DataFrame(filtered_data)
 
-    # Rename the columns using the mapping
-    df.rename(columns=column_mapping, inplace=True)
+from src.model_app import energy_forecast_model
+from src.mongo_app import PERIODS_MS
 
-    return df
 
+# Day number of 1970-01-01 in the proleptic Gregorian ordinal
+EPOCH_ORDINAL = 719163
 
-def json_to_df(json_data):
-    df = map_to_dataframe(json_data)
-    return df
+# Transaction fields read by the forecast
+FORECAST_FIELDS = ["start_date", "charging_time", "total_duration", "energy_consumed_kwh"]
 
+# Features of the model, in training order
+FEATURES = [
+    "Charging Time_zscore",
+    "Start Date_zscore",
+    "Total Duration_zscore",
+    "Start Date_ordinal",
+]
 
-def convert_duration(duration_str):
-    parts = duration_str.split(":")
-    hours = int(parts[0])
-    minutes = int(parts[1])
-    seconds = int(parts[2])
-    total_seconds = hours * 3600 + minutes * 60 + seconds
-    return total_seconds
 
+def to_columns(json_data):
+    """Transposes the projected transactions into NumPy arrays"""
+    return {
+        field: np.array([item.get(field) for item in json_data], dtype=object)
+        for field in FORECAST_FIELDS
+    }
 
-def process_data_for_prediction(json_data):
-    # Convert the JSON data to a DataFrame
-    df = json_to_df(json_data)
 
-    # Convert 'Start Date' and 'End Date' to datetime format
-    df["Start Date"] = pd.to_datetime(df["Start Date"])
-    df["End Date"] = pd.to_datetime(
-        df["End Date"], format="%m/%d/%y %H:%M", errors="coerce"
+def to_hours(durations):
+    # Durations are stored as "H:MM:SS" strings
+    return pd.to_timedelta(durations).total_seconds().to_numpy() / 3600
+
+
+def process_data_for_prediction(columns):
+    """
+    Builds the model features from the transaction columns.
+    :param columns: The arrays returned by to_columns.
+    :return: The feature DataFrame, and the start days as datetime64[D].
+    """
+    start_days = pd.to_datetime(columns["start_date"]).to_numpy().astype("datetime64[D]")
+    start_ordinals = start_days.astype(np.int64) + EPOCH_ORDINAL
+
+    X_new = pd.DataFrame(
+        {
+            "Charging Time_zscore": stats.zscore(to_hours(columns["charging_time"])),
+            "Start Date_zscore": stats.zscore(start_ordinals),
+            "Total Duration_zscore": stats.zscore(to_hours(columns["total_duration"])),
+            "Start Date_ordinal": start_ordinals,
+        },
+        columns=FEATURES,
     )
+    return X_new, start_days
 
-    # Convert 'Charging Time' and 'Total Duration' to timedelta and calculate z-scores
-    df["Charging Time"] = pd.to_timedelta(df["Charging Time"])
-    df["Total Duration"] = pd.to_timedelta(df["Total Duration"])
 
-    # Calculate z-scores for 'Total Duration' and 'Charging Time'
-    df["Total Duration_zscore"] = stats.zscore(
-        df["Total Duration"].dt.total_seconds() / 3600
-    )
-    df["Charging Time_zscore"] = stats.zscore(
-        df["Charging Time"].dt.total_seconds() / 3600
-    )
+def load_and_predict(X_new):
+    # Get the pre-trained model, loaded once and reloaded when it changes
+    xgb_model_loaded = energy_forecast_model.get()
 
-    df["Start Date_ordinal"] = df["Start Date"].apply(lambda x: x.toordinal())
-    df["Start Date_zscore"] = stats.zscore(df["Start Date_ordinal"])
-
-    # Initialize LabelEncoder for categorical features
-    label_encoder = LabelEncoder()
+    # Replace the existing 'Start Date_ordinal' with future ordinals,
+    # one day after another from the last one
+    last_date_ordinal = X_new["Start Date_ordinal"].max()
+    X_new = X_new.assign(
+        **{"Start Date_ordinal": last_date_ordinal + np.arange(1, len(X_new) + 1)}
+    )
 
-    # Apply label encoding to 'Charging Station', 'City', and 'State'
-    df["Charging Station"] = label_encoder.fit_transform(df["Charging Station"])
-    df["City"] = label_encoder.fit_transform(df["City"])
-    df["State"] = label_encoder.fit_transform(df["State"])
+    return xgb_model_loaded.predict(X_new)
 
-    # Define features for prediction (assuming the same features as in training)
-    X_new = df[
-        [
-            "Charging Time_zscore",
-            "Start Date_zscore",
-            "Total Duration_zscore",
-            "Start Date_ordinal",
-        ]
-    ]  # Features
-    return X_new
 
+def forecast(json_data):
+    if not json_data:
+        return {"data": []}
 
-def load_and_predict(json_data):
-    # Load the pre-trained model
-    xgb_model_loaded = joblib.load(ENERGY_FORECAST_MODEL_PATH)
+    columns = to_columns(json_data)
+    X_new, historical_days = process_data_for_prediction(columns)
+    predictions = load_and_predict(X_new)
 
-    # Process the new data to match the format expected by the model
-    X_new = process_data_for_prediction(json_data)
+    # Predictions extend day by day from the last historical date
+    prediction_days = historical_days[-1] + np.arange(1, len(predictions) + 1)
 
-    # Modify 'Start Date_ordinal' to represent future dates
-    last_date_ordinal = X_new["Start Date_ordinal"].max()  # Get the last ordinal value
-    num_predictions = len(X_new)  # Number of predictions to make
+    historical_dates = np.datetime_as_string(historical_days).tolist()
+    prediction_dates = np.datetime_as_string(prediction_days).tolist()
+    historical_energy = columns["energy_consumed_kwh"].tolist()
+    predicted_energy = predictions.tolist()
 
-    # Replace the existing 'Start Date_ordinal' with future ordinals
-    X_new["Start Date_ordinal"] = [
-        last_date_ordinal + i for i in range(1, num_predictions + 1)
+    # Prepare the combined data for frontend
+    combined_data = [
+        {"date": date, "energy": energy, "type": "historical"}
+        for date, energy in zip(historical_dates, historical_energy)
+    ]
+    combined_data += [
+        {"date": date, "energy": energy, "type": "predicted"}
+        for date, energy in zip(prediction_dates, predicted_energy)
     ]
 
-    # Use the modified 'Start Date_ordinal' for predictions
-    y_new_pred = xgb_model_loaded.predict(X_new)
+    # Return combined data as JSON response
+    return {"data": combined_data}
 
-    return y_new_pred
 
+# Resampled forecasts
+# Label units of the periods, minutes keep the hour readable
+PERIOD_LABEL_UNITS = {"daily": "D", "hourly": "m"}
+PERIOD_UNITS = {"daily": "D", "hourly": "h"}
 
-def forecast(json_data):
-    # Process the historical data and extract energy consumption
-    df = json_to_df(json_data)  # Convert to DataFrame
-
-    # Convert 'Start Date' to datetime format
-    df["Start Date"] = pd.to_datetime(df["Start Date"])
-
-    historical_dates = df["Start Date"].tolist()  # Extract dates as datetime objects
-    historical_energy = df[
-        "Energy Consumed"
-    ].tolist()  # Extract historical energy consumption
-
-    # Predict future energy consumption based on future dates
-    predictions = load_and_predict(json_data)
-    predicted_energy = predictions.tolist()  # Convert predictions to a list
-
-    # Assume that predictions extend into the future, we need to generate future dates
-    # Use the last historical date to start predicting future dates
-    last_historical_date = historical_dates[-1]
-    prediction_dates = [
-        last_historical_date + pd.Timedelta(days=i)
-        for i in range(1, len(predicted_energy) + 1)
-    ]
 
-    # Prepare the combined data for frontend
-    combined_data = []
-
-    # Historical data
-    for date, energy in zip(historical_dates, historical_energy):
-        combined_data.append(
-            {
-                "date": date.strftime("%Y-%m-%d"),
-                "energy": energy,
-                "type": "historical",  # Mark as historical
-            }
-        )
-
-    # Predicted data
-    for date, energy in zip(prediction_dates, predicted_energy):
-        combined_data.append(
-            {
-                "date": date.strftime("%Y-%m-%d"),
-                "energy": energy,
-                "type": "predicted",  # Mark as predicted
-            }
-        )
+def to_series_columns(buckets):
+    """Transposes the period buckets into NumPy arrays"""
+    size = len(buckets)
+    columns = {
+        "station_id": np.array([bucket["_id"]["station_id"] for bucket in buckets], dtype=object),
+        "period": np.fromiter((bucket["_id"]["period"] for bucket in buckets), np.int64, size),
+    }
+    for field in ["energy", "sessions", "charging_hours", "duration_hours"]:
+        values = (bucket[field] or 0 for bucket in buckets)
+        columns[field] = np.fromiter(values, np.float64, size)
+    return columns
+
+
+def zscore_from(values, history):
+    """Z-scores of values against the distribution of the history"""
+    std = np.nanstd(history)
+    return (values - np.nanmean(history)) / (std if std else 1)
+
+
+def format_periods(periods, resolution):
+    dates = periods.astype(f"datetime64[{PERIOD_UNITS[resolution]}]")
+    return np.datetime_as_string(dates, unit=PERIOD_LABEL_UNITS[resolution]).tolist()
+
+
+def forecast_series(buckets, resolution, horizon):
+    """
+    Forecasts the energy of each series for a fixed number of periods.
+
+    Every period of the horizon is predicted as one average session, on
+    the series' mean charging time and duration, and scaled by the
+    series' mean sessions per period. All series are predicted in a
+    single model call.
+    :param buckets: The buckets returned by group_by_period.
+    :param resolution: The period length, daily or hourly.
+    :param horizon: The number of periods to predict per series.
+    :return: The historical and predicted points of every series.
+    """
+    if not buckets:
+        return {"data": []}
+
+    columns = to_series_columns(buckets)
+    periods = columns["period"] // PERIODS_MS[resolution]
+    sessions = columns["sessions"]
+
+    # Series are contiguous since buckets are sorted by series
+    station_ids = columns["station_id"]
+    starts = np.flatnonzero(np.r_[True, station_ids[1:] != station_ids[:-1]])
+    lasts = np.r_[starts[1:], len(periods)] - 1
+
+    series_sessions = np.maximum(np.add.reduceat(sessions, starts), 1)
+    mean_charging = np.add.reduceat(columns["charging_hours"], starts) / series_sessions
+    mean_duration = np.add.reduceat(columns["duration_hours"], starts) / series_sessions
+    sessions_per_period = series_sessions / (periods[lasts] - periods[starts] + 1)
+
+    # Start ordinals are in days, hourly periods fall between them
+    periods_per_day = PERIODS_MS["daily"] // PERIODS_MS[resolution]
+    history_ordinals = periods / periods_per_day + EPOCH_ORDINAL
+    future_periods = (periods[lasts][:, None] + np.arange(1, horizon + 1)).ravel()
+    future_ordinals = future_periods / periods_per_day + EPOCH_ORDINAL
+
+    # Per session means of the history, empty periods are ignored
+    with np.errstate(divide="ignore", invalid="ignore"):
+        history_charging = columns["charging_hours"] / sessions
+        history_duration = columns["duration_hours"] / sessions
+
+    X_new = pd.DataFrame(
+        {
+            "Charging Time_zscore": zscore_from(
+                np.repeat(mean_charging, horizon), history_charging
+            ),
+            "Start Date_zscore": zscore_from(future_ordinals, history_ordinals),
+            "Total Duration_zscore": zscore_from(
+                np.repeat(mean_duration, horizon), history_duration
+            ),
+            "Start Date_ordinal": future_ordinals,
+        },
+        columns=FEATURES,
+    )
+    predictions = energy_forecast_model.get().predict(X_new)
+    predicted_energy = predictions * np.repeat(sessions_per_period, horizon)
 
-    # Return combined data as JSON response
-    return {"data": combined_data}
+    historical = zip(
+        station_ids.tolist(),
+        format_periods(periods, resolution),
+        columns["energy"].tolist(),
+    )
+    predicted = zip(
+        np.repeat(station_ids[starts], horizon).tolist(),
+        format_periods(future_periods, resolution),
+        predicted_energy.tolist(),
+    )
+    points = [
+        {"station_id": station_id, "date": date, "energy": energy, "type": "historical"}
+        for station_id, date, energy in historical
+    ]
+    points += [
+        {"station_id": station_id, "date": date, "energy": energy, "type": "predicted"}
+        for station_id, date, energy in predicted
+    ]
+    # Series of the whole scope have no station
+    if station_ids[0] is None:
+        for point in points:
+            del point["station_id"]
+    return {"data": points}
@@ -0,0 +1,119 @@
+import joblib
+import os
+import time
+import traceback
+from datetime import datetime, timezone
+from hashlib import sha256
+from sys import stderr
+from threading import Lock
+
+from src.config import (
+    ENERGY_FORECAST_MODEL_PATH,
+    ENERGY_FORECAST_MODEL_MMAP,
+    MODEL_CHECK_INTERVAL,
+)
+
+
+class LoadedModel:
+    """A deserialized model with the file version it was loaded from"""
+
+    def __init__(self, model, version, stat, loaded_at, load_seconds):
+        self.model = model
+        self.version = version
+        self.stat = stat
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+
+
+def get_file_stat(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_file_version(path):
+    digest = sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelRegistry:
+    """
+    Keeps a model file loaded in memory.
+
+    The file is checked at most once per interval and reloaded when its
+    modification time or size changes. A reload builds the new model
+    before swapping it in, so requests keep using the previous model
+    until then, and also when the new file fails to load.
+    """
+
+    def __init__(self, path, mmap=False, check_interval=30):
+        self.path = path
+        self.mmap_mode = "r" if mmap else None
+        self.check_interval = check_interval
+        self.loaded = None
+        self.checked_at = 0
+        self.reload_count = 0
+        self.last_error = None
+        self.lock = Lock()
+
+    def load(self):
+        started_at = time.monotonic()
+        stat = get_file_stat(self.path)
+        version = get_file_version(self.path)
+        model = joblib.load(self.path, mmap_mode=self.mmap_mode)
+        loaded = LoadedModel(
+            model,
+            version,
+            stat,
+            datetime.now(timezone.utc),
+            time.monotonic() - started_at,
+        )
+        if self.loaded is not None:
+            self.reload_count += 1
+        self.loaded = loaded
+        self.last_error = None
+        return loaded
+
+    def refresh(self):
+        with self.lock:
+            checked_at = time.monotonic()
+            if self.loaded and checked_at - self.checked_at < self.check_interval:
+                return self.loaded
+            try:
+                if self.loaded is None or get_file_stat(self.path) != self.loaded.stat:
+                    self.load()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"ModelLoadError: {self.path}: {e}", file=stderr)
+                print(traceback.format_exc(), file=stderr)
+                if self.loaded is None:
+                    raise
+            self.checked_at = checked_at
+            return self.loaded
+
+    def get(self):
+        loaded = self.loaded
+        if loaded and time.monotonic() - self.checked_at < self.check_interval:
+            return loaded.model
+        return self.refresh().model
+
+    def get_metrics(self):
+        loaded = self.loaded
+        return {
+            "path": self.path,
+            "mmap": self.mmap_mode is not None,
+            "version": loaded.version if loaded else None,
+            "loaded_at": loaded.loaded_at.isoformat() if loaded else None,
+            "load_seconds": loaded.load_seconds if loaded else None,
+            "reload_count": self.reload_count,
+            "last_error": self.last_error,
+        }
+
+
+energy_forecast_model = ModelRegistry(
+    ENERGY_FORECAST_MODEL_PATH,
+    ENERGY_FORECAST_MODEL_MMAP,
+    MODEL_CHECK_INTERVAL,
+)
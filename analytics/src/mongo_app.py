@@ -3,8 +3,13 @@ from pydantic import BaseModel, Field
 
 from src.config import (
     mongo as db,
+    TRANSACTION_BATCH_SIZE,
 )
 
+# Date range of transaction queries without explicit dates
+DEFAULT_START_DATE = "2020-01-01"
+DEFAULT_END_DATE = "2020-12-31"
+
 
 class TransactionQueryParams(BaseModel):
     start_date: str | None = Field(
@@ -92,20 +97,32 @@ def get_current_and_past_date():
 
 
 # Database actions
-def fetch_transactions(query_in):
+def build_transaction_query(query_in):
     """
-    Fetches transactions from the database based on a query.
-    :param query: The query parameters.
-    :return: A list of transactions.
+    Builds the MongoDB filter for transactions from the query parameters.
+    :param query_in: The query parameters.
+    :return: The MongoDB filter.
     """
     query_out = {}
 
     if "station_id" in query_in:
-        # Convert the station_id parameter to a list of integers
-        station_ids = [int(id) for id in query_in["station_id"].split(",")]
-        # station_ids = query_in["station_list"]
+        station_ids = query_in["station_id"]
+        if isinstance(station_ids, str):
+            # Convert the station_id parameter to a list of integers
+            station_ids = [int(id) for id in station_ids.split(",")]
         query_out["station_id"] = {"$in": station_ids}
 
+    if "owner_watermark" in query_in:
+        # Sessions up to the watermark carry the owner ID, newer ones are
+        # matched by station
+        watermark = query_in["owner_watermark"]
+        query_out["$or"] = [
+            {"owner_id": int(query_in["owner_id"]), "_id": {"$lte": watermark}},
+            {"station_id": query_out.pop("station_id"), "_id": {"$gt": watermark}},
+        ]
+    elif "owner_id" in query_in:
+        query_out["owner_id"] = int(query_in["owner_id"])
+
     if "charge_level" in query_in:
         charge_level_map = {"1": "Level 1", "2": "Level 2", "3": "Level 3"}
         charge_levels = [
@@ -119,10 +136,10 @@ def fetch_transactions(query_in):
     # Flter transactions by date range
     if "start_date" not in query_in:
         # query_in["start_date"] = get_current_and_past_date()[1]
-        query_in["start_date"] = "2020-01-01"
+        query_in["start_date"] = DEFAULT_START_DATE
     if "end_date" not in query_in:
         # query_in["end_date"] = get_current_and_past_date()[0]
-        query_in["end_date"] = "2020-12-31"
+        query_in["end_date"] = DEFAULT_END_DATE
 
     start_ms = date_to_milliseconds(query_in["start_date"])
     end_ms = date_to_milliseconds(query_in["end_date"])
@@ -144,11 +161,197 @@ def fetch_transactions(query_in):
     if "user_id" in query_in:
         query_out["user_id"] = int(query_in["user_id"])
 
-    transactions = db.charging_sessions.find(query_out)
-    transactions_list = list(transactions)
-    for transaction in transactions_list:
-        transaction["_id"] = str(transaction["_id"])
-    return transactions_list
+    return query_out
+
+
+def build_projection(fields):
+    if not fields:
+        return None
+    projection = {field: 1 for field in fields}
+    if "_id" not in projection:
+        projection["_id"] = 0
+    return projection
+
+
+def stringify_id(document):
+    if "_id" in document:
+        document["_id"] = str(document["_id"])
+    return document
+
+
+def stream_transactions(query_in, fields=None, batch_size=TRANSACTION_BATCH_SIZE):
+    """
+    Streams transactions from the database based on a query.
+    :param query_in: The query parameters.
+    :param fields: The fields to return, all fields if not given.
+    :param batch_size: The number of transactions fetched per round trip.
+    :return: A generator of transactions.
+    """
+    # The query is built before streaming so invalid parameters fail early
+    query_out = build_transaction_query(query_in)
+    projection = build_projection(fields)
+    cursor = db.charging_sessions.find(query_out, projection, batch_size=batch_size)
+    return (stringify_id(transaction) for transaction in cursor)
+
+
+def fetch_transactions(query_in, fields=None):
+    """
+    Fetches transactions from the database based on a query.
+    :param query: The query parameters.
+    :param fields: The fields to return, all fields if not given.
+    :return: A list of transactions.
+    """
+    return list(stream_transactions(query_in, fields))
+
+
+# Aggregations
+INTERVAL_FORMATS = {"days": "%Y-%m-%d", "months": "%Y-%m", "years": "%Y"}
+
+# Lengths of the periods sessions are resampled to
+PERIODS_MS = {
+    "daily": 24 * 60 * 60 * 1000,
+    "hourly": 60 * 60 * 1000,
+}
+
+
+def time_string_part(index):
+    part = {"$arrayElemAt": ["$$parts", index]}
+    return {"$convert": {"input": part, "to": "int", "onError": None}}
+
+
+def time_string_hours(field):
+    """Expression of a "H:MM:SS" field in hours, 0 when the format is incorrect"""
+    return {
+        "$let": {
+            "vars": {"parts": {"$split": [{"$ifNull": [field, ""]}, ":"]}},
+            "in": {
+                "$cond": [
+                    {"$eq": [{"$size": "$$parts"}, 3]},
+                    {
+                        "$ifNull": [
+                            {
+                                "$add": [
+                                    time_string_part(0),
+                                    {"$divide": [time_string_part(1), 60]},
+                                    {"$divide": [time_string_part(2), 3600]},
+                                ]
+                            },
+                            0,
+                        ]
+                    },
+                    0,
+                ]
+            },
+        }
+    }
+
+
+CHARGING_HOURS = time_string_hours("$charging_time")
+DURATION_HOURS = time_string_hours("$total_duration")
+
+TRANSACTION_METRICS = {
+    "revenue": {"$sum": "$fee"},
+    "sessions_count": {"$sum": 1},
+    "energy_consumption": {"$sum": "$energy_consumed_kwh"},
+    "charging_hours": {"$sum": CHARGING_HOURS},
+}
+
+
+class MetricSource:
+    """Fields of the documents the grouping stages sum metrics from"""
+
+    def __init__(self, date, hour, metrics):
+        self.date = date
+        self.hour = hour
+        self.metrics = metrics
+
+
+SESSIONS = MetricSource(
+    date="$transaction_date",
+    hour={"$hour": {"$toDate": "$transaction_date"}},
+    metrics=TRANSACTION_METRICS,
+)
+
+
+def get_interval_format(interval):
+    if interval not in INTERVAL_FORMATS:
+        raise ValueError("Invalid interval. Choose from 'days', 'months', or 'years'.")
+    return INTERVAL_FORMATS[interval]
+
+
+def group_by_interval(interval, metrics, source=SESSIONS):
+    """
+    Builds the pipeline stages summing metrics per UTC time interval.
+    :param interval: The interval, one of days, months or years.
+    :param metrics: The names of the metrics in TRANSACTION_METRICS.
+    :param source: The documents the metrics are summed from.
+    :return: The pipeline stages, yielding buckets sorted by label.
+    """
+    date = {"$toDate": source.date}
+    label = {"$dateToString": {"format": get_interval_format(interval), "date": date}}
+    group = {"_id": label}
+    for metric in metrics:
+        group[metric] = source.metrics[metric]
+    return [{"$group": group}, {"$sort": {"_id": 1}}]
+
+
+def group_by_hour(source=SESSIONS):
+    count = source.metrics["sessions_count"]
+    return [{"$group": {"_id": source.hour, "count": count}}]
+
+
+def group_by_interval_and_hour(interval, metrics, source=SESSIONS):
+    return [
+        {
+            "$facet": {
+                "by_date": group_by_interval(interval, metrics, source),
+                "by_hour": group_by_hour(source),
+            }
+        }
+    ]
+
+
+def group_by_station(metric, count, order, source=SESSIONS):
+    direction = -1 if order == "desc" else 1
+    return [
+        {"$group": {"_id": "$station_id", metric: source.metrics[metric]}},
+        {"$sort": {metric: direction, "_id": 1}},
+        {"$limit": count},
+    ]
+
+
+def group_by_period(resolution, by_station):
+    """
+    Builds the pipeline stages summing raw sessions per UTC period, since
+    session durations are not kept on the rollups.
+    :param resolution: The period length, daily or hourly.
+    :param by_station: Whether each station is a separate series.
+    :return: The pipeline stages, yielding buckets sorted by series and period.
+    """
+    if resolution not in PERIODS_MS:
+        raise ValueError("Invalid resolution. Choose from 'daily' or 'hourly'.")
+    date = SESSIONS.date
+    period = {"$subtract": [date, {"$mod": [date, PERIODS_MS[resolution]]}]}
+    key = {"station_id": "$station_id" if by_station else None, "period": period}
+    group = {
+        "_id": key,
+        "energy": TRANSACTION_METRICS["energy_consumption"],
+        "sessions": TRANSACTION_METRICS["sessions_count"],
+        "charging_hours": TRANSACTION_METRICS["charging_hours"],
+        "duration_hours": {"$sum": DURATION_HOURS},
+    }
+    return [{"$group": group}, {"$sort": {"_id.station_id": 1, "_id.period": 1}}]
+
+
+def aggregate_transactions(query_in, build_stages):
+    """
+    Aggregates the transactions matching a query in MongoDB.
+    :param query_in: The query parameters.
+    :param build_stages: Builds the pipeline stages for a MetricSource.
+    :return: A list of aggregated documents.
+    """
+    pipeline = [{"$match": build_transaction_query(query_in)}, *build_stages(SESSIONS)]
+    return list(db.charging_sessions.aggregate(pipeline))
 
 
 def fetch_evse_status(query_in):
@@ -0,0 +1,108 @@
+import time
+import traceback
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from sys import stderr
+from threading import Lock, Thread
+
+from src.config import (
+    mongo as db,
+    OWNER_STAMP_REFRESH_INTERVAL,
+    OWNER_STATIONS_IN_LIMIT,
+    ROLLUP_SETTLE_SECONDS,
+)
+from src.sql_app import query_station_ids_by_large_owner
+
+refresh_lock = Lock()
+last_refresh = 0
+indexes_created = False
+
+
+# Owner stamp maintenance
+def create_indexes():
+    global indexes_created
+    if indexes_created:
+        return
+    db.charging_sessions.create_index("owner_id")
+    indexes_created = True
+
+
+def stamp_owner(owner_id, station_ids, watermark):
+    """
+    Stores the owner ID on the owner's sessions up to the watermark, so
+    owners with many stations can be filtered on it instead of a large $in.
+    :param owner_id: The ID of the owner.
+    :param station_ids: The IDs of the owner's stations.
+    :param watermark: The last session _id to stamp.
+    """
+    previous = db.owner_stamps.find_one({"_id": owner_id})
+    window = {"$lte": watermark}
+    if previous and set(previous["station_ids"]) == set(station_ids):
+        # Only sessions added since the last stamp need it
+        window["$gt"] = previous["watermark"]
+    else:
+        # Stations the owner no longer has lose their stamps
+        db.charging_sessions.update_many(
+            {"owner_id": owner_id, "station_id": {"$nin": station_ids}},
+            {"$unset": {"owner_id": ""}},
+        )
+
+    db.charging_sessions.update_many(
+        {
+            "_id": window,
+            "station_id": {"$in": station_ids},
+            "owner_id": {"$ne": owner_id},
+        },
+        {"$set": {"owner_id": owner_id}},
+    )
+    db.owner_stamps.replace_one(
+        {"_id": owner_id},
+        {"watermark": watermark, "station_ids": station_ids},
+        upsert=True,
+    )
+
+
+def refresh_owner_stamps():
+    """Stamps the sessions of every owner with more stations than the $in limit"""
+    # Sessions newer than the settle time may still be inserted out of order
+    settled = datetime.now(timezone.utc) - timedelta(seconds=ROLLUP_SETTLE_SECONDS)
+    watermark = ObjectId.from_datetime(settled)
+
+    create_indexes()
+    owners = query_station_ids_by_large_owner(OWNER_STATIONS_IN_LIMIT)
+    for owner_id, station_ids in owners.items():
+        stamp_owner(owner_id, station_ids, watermark)
+    db.owner_stamps.delete_many({"_id": {"$nin": list(owners)}})
+
+
+def run_refresh():
+    try:
+        refresh_owner_stamps()
+    except Exception as e:
+        print(f"OwnerStampRefreshError: {e}", file=stderr)
+        print(traceback.format_exc(), file=stderr)
+    finally:
+        refresh_lock.release()
+
+
+def schedule_refresh():
+    global last_refresh
+    if time.monotonic() - last_refresh < OWNER_STAMP_REFRESH_INTERVAL:
+        return
+    if not refresh_lock.acquire(blocking=False):
+        return
+    last_refresh = time.monotonic()
+    Thread(target=run_refresh, daemon=True).start()
+
+
+# Owner stamp queries
+def get_stamp_watermark(owner_id, station_ids):
+    """
+    Returns the last session _id stamped with the owner ID, or None when
+    the owner's sessions were stamped for a different set of stations.
+    """
+    schedule_refresh()
+    stamps = db.owner_stamps.find_one({"_id": owner_id})
+    if stamps is None or set(stamps["station_ids"]) != set(station_ids):
+        return None
+    return stamps["watermark"]
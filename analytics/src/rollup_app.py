@@ -0,0 +1,284 @@
+import time
+import traceback
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from sys import stderr
+from threading import Lock, Thread
+
+from src.config import (
+    mongo as db,
+    ROLLUP_ENABLED,
+    ROLLUP_REFRESH_INTERVAL,
+    ROLLUP_SETTLE_SECONDS,
+)
+from src.mongo_app import (
+    aggregate_transactions,
+    build_transaction_query,
+    MetricSource,
+    CHARGING_HOURS,
+    TRANSACTION_METRICS,
+)
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Rollup collections by granularity, summed per station and UTC day/hour
+ROLLUP_COLLECTIONS = {
+    "daily": "charging_sessions_daily",
+    "hourly": "charging_sessions_hourly",
+}
+
+# Station attributes kept on the rollups so they can be filtered on
+ROLLUP_FIELDS = ["station_id", "city", "state", "country", "postal_code"]
+
+# Query parameters that can be answered from the rollups
+ROLLUP_PARAMS = {"start_date", "end_date", *ROLLUP_FIELDS}
+
+ROLLUPS = MetricSource(
+    date="$day_ms",
+    hour="$hour",
+    metrics={metric: {"$sum": f"${metric}"} for metric in TRANSACTION_METRICS},
+)
+
+WATERMARK_ID = "charging_sessions"
+
+refresh_lock = Lock()
+last_refresh = 0
+indexes_created = False
+
+
+# Rollup maintenance
+def get_bucket_key(granularity):
+    """Expressions of the rollup bucket a session falls into"""
+    time_of_day = {"$mod": ["$transaction_date", DAY_MS]}
+    key = {field: f"${field}" for field in ROLLUP_FIELDS}
+    key["day_ms"] = {"$subtract": ["$transaction_date", time_of_day]}
+    if granularity == "hourly":
+        key["hour"] = {"$hour": {"$toDate": "$transaction_date"}}
+    return key
+
+
+def build_rollup_stages(granularity, watermark):
+    """
+    Builds the stages summing sessions into rollup documents.
+    :param granularity: The rollup granularity, daily or hourly.
+    :param watermark: The last session _id included in the rollups.
+    :return: The pipeline stages, ending with a $merge into the rollup.
+    """
+    key = get_bucket_key(granularity)
+    group = {"_id": key, **TRANSACTION_METRICS}
+    fields = {field: f"$_id.{field}" for field in key}
+    # Rebuilt buckets only replace ones computed up to an older watermark
+    newer = {"$gte": ["$$new.watermark", "$watermark"]}
+    return [
+        {"$group": group},
+        {"$set": {**fields, "watermark": watermark}},
+        {
+            "$merge": {
+                "into": ROLLUP_COLLECTIONS[granularity],
+                "on": "_id",
+                "whenMatched": [
+                    {"$replaceWith": {"$cond": [newer, "$$new", "$$ROOT"]}}
+                ],
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+def get_watermark():
+    state = db.rollup_state.find_one({"_id": WATERMARK_ID})
+    return state["watermark"] if state else None
+
+
+def create_indexes():
+    global indexes_created
+    if indexes_created:
+        return
+    for collection in ROLLUP_COLLECTIONS.values():
+        db[collection].create_index([("day_ms", 1), ("station_id", 1)])
+    indexes_created = True
+
+
+def refresh_rollups():
+    """
+    Rolls up the sessions added since the watermark.
+
+    Every station and day touched by the new sessions is recomputed from
+    all of its sessions up to the new watermark, so a refresh can safely
+    be repeated or run concurrently.
+    """
+    # Sessions newer than the settle time may still be inserted out of order
+    settled = datetime.now(timezone.utc) - timedelta(seconds=ROLLUP_SETTLE_SECONDS)
+    watermark = ObjectId.from_datetime(settled)
+    previous = get_watermark()
+    window = {"$lte": watermark}
+    if previous:
+        window["$gt"] = previous
+
+    create_indexes()
+    summary = list(
+        db.charging_sessions.aggregate(
+            [
+                {"$match": {"_id": window}},
+                {
+                    "$group": {
+                        "_id": None,
+                        "station_ids": {"$addToSet": "$station_id"},
+                        "start": {"$min": "$transaction_date"},
+                        "end": {"$max": "$transaction_date"},
+                    }
+                },
+            ]
+        )
+    )
+    if summary:
+        start = summary[0]["start"] - summary[0]["start"] % DAY_MS
+        end = summary[0]["end"] - summary[0]["end"] % DAY_MS + DAY_MS
+        match = {
+            "_id": {"$lte": watermark},
+            "station_id": {"$in": summary[0]["station_ids"]},
+            "transaction_date": {"$gte": start, "$lt": end},
+        }
+        for granularity in ROLLUP_COLLECTIONS:
+            stages = build_rollup_stages(granularity, watermark)
+            db.charging_sessions.aggregate([{"$match": match}, *stages])
+
+    db.rollup_state.update_one(
+        {"_id": WATERMARK_ID},
+        {"$max": {"watermark": watermark}},
+        upsert=True,
+    )
+
+
+def run_refresh():
+    try:
+        refresh_rollups()
+    except Exception as e:
+        print(f"RollupRefreshError: {e}", file=stderr)
+        print(traceback.format_exc(), file=stderr)
+    finally:
+        refresh_lock.release()
+
+
+def schedule_refresh():
+    global last_refresh
+    if time.monotonic() - last_refresh < ROLLUP_REFRESH_INTERVAL:
+        return
+    if not refresh_lock.acquire(blocking=False):
+        return
+    last_refresh = time.monotonic()
+    Thread(target=run_refresh, daemon=True).start()
+
+
+# Rollup queries
+def can_use_rollups(query_in):
+    return set(query_in).issubset(ROLLUP_PARAMS)
+
+
+def as_rollup(granularity):
+    """Projects raw sessions to the shape of rollup documents"""
+    fields = {field: f"${field}" for field in ROLLUP_FIELDS}
+    fields["day_ms"] = "$transaction_date"
+    if granularity == "hourly":
+        fields["hour"] = {"$hour": {"$toDate": "$transaction_date"}}
+    fields["revenue"] = "$fee"
+    fields["sessions_count"] = {"$literal": 1}
+    fields["energy_consumption"] = "$energy_consumed_kwh"
+    fields["charging_hours"] = CHARGING_HOURS
+    return {"$project": fields}
+
+
+def exclude_rolled_up(granularity, end_ms):
+    """
+    Builds the stages dropping raw sessions already summed into the
+    rollup bucket they fall into.
+
+    Buckets are rebuilt before the watermark advances, and the daily and
+    hourly rollups separately, so a bucket may already include sessions
+    newer than the watermark. Each bucket stores the watermark it was
+    built up to, and a session is only read raw when it is newer.
+    """
+    key = get_bucket_key(granularity)
+    names = {field: f"key_{field}" for field in key}
+    conditions = [{"$eq": [f"${field}", f"$${names[field]}"]} for field in key]
+    conditions.append({"$gte": ["$watermark", "$$session_id"]})
+    # The end date's day is not read from the rollups
+    conditions.append({"$lt": ["$day_ms", end_ms]})
+    return [
+        {
+            "$lookup": {
+                "from": ROLLUP_COLLECTIONS[granularity],
+                "let": {
+                    "session_id": "$_id",
+                    **{names[field]: value for field, value in key.items()},
+                },
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": conditions}}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}},
+                ],
+                "as": "rolled_up",
+            }
+        },
+        {"$match": {"rolled_up": []}},
+    ]
+
+
+def aggregate_rollups(query_out, build_stages, granularity, watermark):
+    """
+    Aggregates transactions from the rollups, plus the raw sessions that
+    are not rolled up yet.
+
+    Days are rolled up whole, so the rollups cover the days from the
+    start date up to the end date; the sessions at the end date's first
+    millisecond, which the date filter also includes, are read raw.
+    """
+    start_ms = query_out["transaction_date"]["$gte"]
+    end_ms = query_out["transaction_date"]["$lte"]
+
+    rollup_match = {"day_ms": {"$gte": start_ms, "$lt": end_ms}}
+    for field in ROLLUP_FIELDS:
+        if field in query_out:
+            rollup_match[field] = query_out[field]
+    tail_match = {
+        **query_out,
+        "$or": [{"_id": {"$gt": watermark}}, {"transaction_date": end_ms}],
+    }
+    tail_pipeline = [
+        {"$match": tail_match},
+        *exclude_rolled_up(granularity, end_ms),
+        as_rollup(granularity),
+    ]
+
+    pipeline = [
+        {"$match": rollup_match},
+        {
+            "$unionWith": {
+                "coll": "charging_sessions",
+                "pipeline": tail_pipeline,
+            }
+        },
+        *build_stages(ROLLUPS),
+    ]
+    return list(db[ROLLUP_COLLECTIONS[granularity]].aggregate(pipeline))
+
+
+def aggregate_transaction_metrics(query_in, build_stages, granularity="daily"):
+    """
+    Aggregates the transactions matching a query, from the rollups when
+    the query only filters on dates and station attributes.
+    :param query_in: The query parameters.
+    :param build_stages: Builds the pipeline stages for a MetricSource.
+    :param granularity: The rollup granularity the stages need.
+    :return: A list of aggregated documents.
+    """
+    if not ROLLUP_ENABLED or not can_use_rollups(query_in):
+        return aggregate_transactions(query_in, build_stages)
+
+    schedule_refresh()
+    watermark = get_watermark()
+    query_out = build_transaction_query(query_in)
+    date_range = query_out["transaction_date"]
+    if watermark is None or None in (date_range["$gte"], date_range["$lte"]):
+        return aggregate_transactions(query_in, build_stages)
+    return aggregate_rollups(query_out, build_stages, granularity, watermark)
@@ -1,9 +1,12 @@
 from pydantic import BaseModel, Field
 from typing import Optional
 import sys
+from datetime import datetime, timedelta, timezone
 
 from src.config import (
+    mongo as db,
     mysql_pool,
+    OWNER_STATIONS_CACHE_TTL,
 )
 from src.utils import sanitize_input
 
@@ -43,4 +46,42 @@ def query_stations_list_by_owner(owner_id: int = None):
         query = f"SELECT id FROM stations_joined WHERE owner_id = {owner_id}"
     result = fetch_data(query)
     ids_list = [item['id'] for item in result]
-    return ids_list
\ No newline at end of file
+    return ids_list
+
+def query_station_ids_by_large_owner(min_count: int):
+    query = (
+        "SELECT owner_id, id FROM stations_joined WHERE owner_id IN "
+        "(SELECT owner_id FROM stations_joined GROUP BY owner_id "
+        f"HAVING COUNT(*) > {int(min_count)})"
+    )
+    station_ids = {}
+    for item in fetch_data(query):
+        station_ids.setdefault(item['owner_id'], []).append(item['id'])
+    return station_ids
+
+
+# Station IDs by owner ID, cached in MongoDB so that every worker sees
+# the same stations and a refresh reaches all of them
+owner_stations_indexed = False
+
+
+def get_owner_station_ids(owner_id: int, refresh: bool = False):
+    global owner_stations_indexed
+    if not owner_stations_indexed:
+        db.owner_stations.create_index("expires_at", expireAfterSeconds=0)
+        owner_stations_indexed = True
+
+    now = datetime.now(timezone.utc)
+    if not refresh:
+        entry = db.owner_stations.find_one({"_id": owner_id, "expires_at": {"$gt": now}})
+        if entry:
+            return entry["station_ids"]
+
+    station_ids = query_stations_list_by_owner(owner_id)
+    expires_at = now + timedelta(seconds=OWNER_STATIONS_CACHE_TTL)
+    db.owner_stations.replace_one(
+        {"_id": owner_id},
+        {"station_ids": station_ids, "expires_at": expires_at},
+        upsert=True,
+    )
+    return station_ids
@@ -1,3 +1,9 @@
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
 # Sanitize input
 def sanitize_input(input_string):
     """
@@ -12,4 +18,60 @@ def sanitize_input(input_string):
     sanitized_string = input_string.replace("\n", "").replace("\r", "")
     sanitized_string = sanitized_string.replace("'", "\\'").replace('"', '\\"')
 
-    return sanitized_string
\ No newline at end of file
+    return sanitized_string
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Streamed JSON
+def iter_json_array(items):
+    """Encodes items as a JSON array, one item at a time"""
+    separator = "["
+    for item in items:
+        yield separator + json.dumps(item, default=str)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def iter_ndjson(items):
+    """Encodes items as newline-delimited JSON"""
+    for item in items:
+        yield json.dumps(item, default=str) + "\n"
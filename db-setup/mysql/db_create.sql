@@ -56,9 +56,12 @@ CREATE TABLE Site (
     country VARCHAR(255) NOT NULL DEFAULT 'USA',
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    location POINT SRID 0 AS (POINT(longitude, latitude)) STORED NOT NULL INVISIBLE,
     PRIMARY KEY (id),
-    KEY idx_owner_id (owner_id),
+    KEY idx_owner_id_created_at_id (owner_id,created_at,id),
+    KEY idx_created_at_id (created_at,id),
     KEY idx_zip_code (zip_code),
+    SPATIAL KEY idx_location (location),
     FULLTEXT KEY idx_txt_name (name),
 	FULLTEXT KEY idx_txt_city (city),
 	FULLTEXT KEY idx_txt_state (state),
@@ -78,7 +81,10 @@ CREATE TABLE Station (
     site_id INT UNSIGNED NOT NULL,
     created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    location POINT SRID 0 AS (POINT(longitude, latitude)) STORED NOT NULL INVISIBLE,
     PRIMARY KEY (id),
+    KEY idx_created_at_id (created_at,id),
+    SPATIAL KEY idx_location (location),
     CONSTRAINT fk_Station_Site FOREIGN KEY (site_id)
     REFERENCES Site(id) ON DELETE RESTRICT ON UPDATE CASCADE
 );
@@ -99,6 +105,7 @@ CREATE TABLE EVSE (
     KEY idx_station_id (station_id),
     KEY idx_connector_type (connector_type),
     KEY idx_charge_level (charge_level),
+    KEY idx_created_at_id (created_at,id),
     CONSTRAINT fk_EVSE_Station FOREIGN KEY (station_id)
     REFERENCES Station(id) ON DELETE RESTRICT ON UPDATE CASCADE
 );
@@ -191,3 +198,186 @@ SELECT
     e.created_at AS created_at,
 	e.updated_at AS updated_at
 FROM stations_joined s JOIN EVSE e ON s.id = e.station_id;
+
+-- Denormalized read tables of stations_joined and evses_joined,
+-- kept in sync by the triggers below
+CREATE TABLE stations_materialized (
+    id INT UNSIGNED NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    latitude DECIMAL(9,6) NOT NULL,
+    longitude DECIMAL(9,6) NOT NULL,
+    site_id INT UNSIGNED NOT NULL,
+    owner_id INT UNSIGNED NOT NULL,
+    site_latitude DECIMAL(9,6) NOT NULL,
+    site_longitude DECIMAL(9,6) NOT NULL,
+    site_name VARCHAR(255) NOT NULL,
+    street_address VARCHAR(255) NOT NULL,
+    zip_code VARCHAR(20) NOT NULL,
+    city VARCHAR(255) NOT NULL,
+    state CHAR(2) NOT NULL,
+    country VARCHAR(255) NOT NULL,
+    created_at DATETIME NULL,
+    updated_at DATETIME NULL,
+    location POINT SRID 0 AS (POINT(longitude, latitude)) STORED NOT NULL INVISIBLE,
+    PRIMARY KEY (id),
+    KEY idx_site_id (site_id),
+    KEY idx_owner_id_created_at_id (owner_id,created_at,id),
+    KEY idx_created_at_id (created_at,id),
+    SPATIAL KEY idx_location (location),
+    FULLTEXT KEY idx_txt_site_name (site_name),
+    FULLTEXT KEY idx_txt_city (city),
+    FULLTEXT KEY idx_txt_state (state),
+    FULLTEXT KEY idx_txt_zip_code (zip_code),
+    FULLTEXT KEY idx_txt_country (country),
+    FULLTEXT KEY idx_txt_street_address (street_address),
+    FULLTEXT KEY idx_txt_country_state_city_zip_street_site (country,state,city,zip_code,street_address,site_name)
+);
+
+CREATE TABLE evses_materialized (
+    id INT UNSIGNED NOT NULL,
+    station_id INT UNSIGNED NOT NULL,
+    evse_id INT UNSIGNED NOT NULL,
+    connector_type VARCHAR(50) NOT NULL,
+    price DECIMAL(10,2) NOT NULL,
+    charge_level VARCHAR(50) NOT NULL,
+    station_name VARCHAR(255) NOT NULL,
+    latitude DECIMAL(9,6) NOT NULL,
+    longitude DECIMAL(9,6) NOT NULL,
+    site_id INT UNSIGNED NOT NULL,
+    owner_id INT UNSIGNED NOT NULL,
+    site_latitude DECIMAL(9,6) NOT NULL,
+    site_longitude DECIMAL(9,6) NOT NULL,
+    site_name VARCHAR(255) NOT NULL,
+    street_address VARCHAR(255) NOT NULL,
+    zip_code VARCHAR(20) NOT NULL,
+    city VARCHAR(255) NOT NULL,
+    state CHAR(2) NOT NULL,
+    country VARCHAR(255) NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    location POINT SRID 0 AS (POINT(longitude, latitude)) STORED NOT NULL INVISIBLE,
+    PRIMARY KEY (id),
+    UNIQUE KEY idx_station_id_evse_id (station_id,evse_id),
+    KEY idx_site_id (site_id),
+    KEY idx_owner_id_created_at_id (owner_id,created_at,id),
+    KEY idx_created_at_id (created_at,id),
+    KEY idx_connector_type (connector_type),
+    KEY idx_charge_level (charge_level),
+    SPATIAL KEY idx_location (location),
+    FULLTEXT KEY idx_txt_site_name (site_name),
+    FULLTEXT KEY idx_txt_city (city),
+    FULLTEXT KEY idx_txt_state (state),
+    FULLTEXT KEY idx_txt_zip_code (zip_code),
+    FULLTEXT KEY idx_txt_country (country),
+    FULLTEXT KEY idx_txt_street_address (street_address),
+    FULLTEXT KEY idx_txt_country_state_city_zip_street_site (country,state,city,zip_code,street_address,site_name),
+    FULLTEXT KEY idx_txt_site_street_city (site_name,street_address,city)
+);
+
+-- Version of site, station and EVSE data, bumped on every change
+CREATE TABLE catalog_version (
+    id TINYINT UNSIGNED NOT NULL,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (id)
+);
+
+INSERT INTO catalog_version (id, version) VALUES (1, 0);
+
+INSERT INTO stations_materialized SELECT * FROM stations_joined;
+INSERT INTO evses_materialized SELECT * FROM evses_joined;
+
+-- Triggers to refresh the denormalized read tables and the catalog version
+DELIMITER //
+CREATE TRIGGER materialize_site_insert
+AFTER INSERT ON Site
+FOR EACH ROW
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_site_update
+AFTER UPDATE ON Site
+FOR EACH ROW
+BEGIN
+    DELETE FROM stations_materialized WHERE site_id = OLD.id;
+    INSERT INTO stations_materialized
+    SELECT * FROM stations_joined WHERE site_id = NEW.id;
+    DELETE FROM evses_materialized WHERE site_id = OLD.id;
+    INSERT INTO evses_materialized
+    SELECT * FROM evses_joined WHERE site_id = NEW.id;
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_site_delete
+AFTER DELETE ON Site
+FOR EACH ROW
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_station_insert
+AFTER INSERT ON Station
+FOR EACH ROW
+BEGIN
+    INSERT INTO stations_materialized
+    SELECT * FROM stations_joined WHERE id = NEW.id;
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_station_update
+AFTER UPDATE ON Station
+FOR EACH ROW
+BEGIN
+    DELETE FROM stations_materialized WHERE id = OLD.id;
+    INSERT INTO stations_materialized
+    SELECT * FROM stations_joined WHERE id = NEW.id;
+    DELETE FROM evses_materialized WHERE station_id = OLD.id;
+    INSERT INTO evses_materialized
+    SELECT * FROM evses_joined WHERE station_id = NEW.id;
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_station_delete
+AFTER DELETE ON Station
+FOR EACH ROW
+BEGIN
+    DELETE FROM stations_materialized WHERE id = OLD.id;
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_evse_insert
+AFTER INSERT ON EVSE
+FOR EACH ROW
+BEGIN
+    INSERT INTO evses_materialized
+    SELECT * FROM evses_joined WHERE id = NEW.id;
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_evse_update
+AFTER UPDATE ON EVSE
+FOR EACH ROW
+BEGIN
+    DELETE FROM evses_materialized WHERE id = OLD.id;
+    INSERT INTO evses_materialized
+    SELECT * FROM evses_joined WHERE id = NEW.id;
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+
+CREATE TRIGGER materialize_evse_delete
+AFTER DELETE ON EVSE
+FOR EACH ROW
+BEGIN
+    DELETE FROM evses_materialized WHERE id = OLD.id;
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+//
+DELIMITER ;
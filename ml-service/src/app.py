@@ -4,14 +4,31 @@ from flask_cors import CORS
 from datetime import datetime
 from src.config import WEB_DOMAINS
 from src.middlewares import auth
-from src.station_prediction.model import StationPredictionModel
-from src.wait_time.model import WaitTimeModel
+from src.station_prediction.model import station_prediction_model
+from src.wait_time.model import wait_time_model
+from src.wait_time.predictions import prediction_cache, predict_wait_times
+from src.wait_time.table import wait_time_table
 from src.utils import handle_error
 
 app = Flask(__name__)
 app.json.sort_keys = False
 CORS(app, resources={r"/api/*": {"origins": WEB_DOMAINS}})
 
+station_prediction_model.preload()
+wait_time_model.preload()
+if wait_time_table:
+    wait_time_table.preload()
+
+# Fields of batch wait time entries, with their types
+BATCH_FIELDS = [
+    ("station_id", int),
+    ("evse_id", int),
+    ("latitude", float),
+    ("longitude", float),
+    ("hour_of_day", int),
+    ("day_of_week", int),
+]
+
 
 # Handle price prediction
 @app.route("/api/station-prediction", methods=["GET"])
@@ -29,7 +46,7 @@ def predict_station_location():
         except Exception as e:
             raise Exception(f"Invalid zip_code value", 400)
 
-        model = StationPredictionModel()
+        model = station_prediction_model.get()
         locations = model.predict(zip_code)
         return locations, 200
     except Exception as e:
@@ -78,17 +95,16 @@ def predict_wait_time():
                 "Invalid parameter type. Ensure numeric values where appropriate.", 400
             )
 
-        # Load and predict using the WaitTimeModel
-        model = WaitTimeModel()
-        wait_time_estimate = model.predict(
-            evse_id,
-            station_id,
-            latitude,
-            longitude,
-            hour_of_day,
-            day_of_week,
-            elapsed_time,
-        )
+        # Predict using the WaitTimeModel, or the cached prediction
+        features = {
+            "evse_id": [evse_id],
+            "station_id": [station_id],
+            "latitude": [latitude],
+            "longitude": [longitude],
+            "hour_of_day": [hour_of_day],
+            "day_of_week": [day_of_week],
+        }
+        wait_time_estimate = predict_wait_times(features)[0]
 
         return {"wait_time_estimate": wait_time_estimate}, 200
     except Exception as e:
@@ -100,49 +116,70 @@ def predict_wait_time():
 def batch_wait_time():
     try:
         body = request.get_json()
-        if not body:
+        if not body or not isinstance(body, list):
             raise Exception("Invalid request body", 400)
 
-        model = WaitTimeModel()
-        wait_times = []
-        for entry in body:
-            args = {}
-            for field in [
-                "station_id",
-                "evse_id",
-                "latitude",
-                "longitude",
-                "hour_of_day",
-                "day_of_week",
-            ]:
+        # Validate every entry before predicting, into feature columns
+        features = {field: [] for field, _ in BATCH_FIELDS}
+        for index, entry in enumerate(body):
+            if not isinstance(entry, dict):
+                raise Exception(f"Invalid entry at index {index}", 400)
+            for field, convert in BATCH_FIELDS:
                 value = entry.get(field)
                 if value is None:
-                    raise Exception(f"{field} is required", 400)
-                args[field] = entry.get(field)
-
-            args["elapsed_time"] = 0
-            wait_time_estimate = model.predict(
-                station_id=args.get("station_id"),
-                evse_id=args.get("evse_id"),
-                latitude=args.get("latitude"),
-                longitude=args.get("longitude"),
-                hour_of_day=args.get("hour_of_day"),
-                day_of_week=args.get("day_of_week"),
-                elapsed_time=args.get("elapsed_time"),
+                    raise Exception(f"{field} is required at index {index}", 400)
+                try:
+                    features[field].append(convert(value))
+                except (TypeError, ValueError):
+                    raise Exception(f"Invalid {field} value at index {index}", 400)
+
+        wait_time_estimates = predict_wait_times(features)
+
+        wait_times = [
+            {
+                "station_id": station_id,
+                "evse_id": evse_id,
+                "wait_time": wait_time_estimate,
+            }
+            for station_id, evse_id, wait_time_estimate in zip(
+                features["station_id"], features["evse_id"], wait_time_estimates
             )
-            wait_times.append(
-                {
-                    "station_id": args["station_id"],
-                    "evse_id": args["evse_id"],
-                    "wait_time": wait_time_estimate,
-                }
-            )
-
+        ]
         return wait_times, 200
     except Exception as e:
         return handle_error(e)
 
 
+@app.route("/api/wait-time/cache", methods=["GET"])
+@auth.require_permission("staff")
+def wait_time_cache_stats():
+    try:
+        _, version = wait_time_model.get_versioned()
+        table = wait_time_table.get() if wait_time_table else None
+        stats = {
+            "model_version": version,
+            "table_model_version": table.model_version if table else None,
+            "table_size": len(table.index) if table else 0,
+        }
+        return {**stats, **prediction_cache.get_stats()}, 200
+    except Exception as e:
+        return handle_error(e)
+
+
+@app.route("/api/models", methods=["GET"])
+@auth.require_permission("staff")
+def model_metrics():
+    try:
+        models = {
+            "station_prediction": station_prediction_model.get_metrics(),
+            "wait_time": wait_time_model.get_metrics(),
+            "wait_time_table": wait_time_table.get_metrics() if wait_time_table else None,
+        }
+        return models, 200
+    except Exception as e:
+        return handle_error(e)
+
+
 # Handle path not found
 @app.errorhandler(404)
 def path_not_found(_):
@@ -8,10 +8,24 @@ PORT = os.getenv("PORT")
 WEB_DOMAINS = os.environ["WEB_DOMAINS"].split(",") or "*"
 MONGODB_URI = os.environ["MONGODB_URI"]
 AUTH_API = os.environ["AUTH_API"]
+AUTH_JWT_SECRET = os.environ.get("AUTH_JWT_SECRET")
+AUTH_CACHE_MAXSIZE = int(os.environ.get("AUTH_CACHE_MAXSIZE", 10000))
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_NEGATIVE_TTL = int(os.environ.get("AUTH_CACHE_NEGATIVE_TTL", 30))
 STATION_API = os.environ["STATION_API"]
 STATION_PREDICTION_MODEL_PATH = os.environ["STATION_PREDICTION_MODEL_PATH"]
 WAIT_TIME_MODEL_PATH = os.environ["WAIT_TIME_MODEL_PATH"]
+MODEL_CHECK_INTERVAL = int(os.environ.get("MODEL_CHECK_INTERVAL", 30))
+WAIT_TIME_BATCH_CHUNK_SIZE = int(os.environ.get("WAIT_TIME_BATCH_CHUNK_SIZE", 1000))
+WAIT_TIME_CACHE_MAXSIZE = int(os.environ.get("WAIT_TIME_CACHE_MAXSIZE", 10000))
+WAIT_TIME_CACHE_TTL = int(os.environ.get("WAIT_TIME_CACHE_TTL", 300))
+WAIT_TIME_TABLE_PATH = os.environ.get("WAIT_TIME_TABLE_PATH")
 
 # MongoDB Configuration
 MONGODB_DATABASE = pymongo.uri_parser.parse_uri(MONGODB_URI)["database"]
-mongo = pymongo.MongoClient(MONGODB_URI)[MONGODB_DATABASE]
+# Connects on first use, so the client is not shared across forks
+mongo = pymongo.MongoClient(MONGODB_URI, connect=False)[MONGODB_DATABASE]
+
+# Gunicorn Configuration
+# Models are loaded before workers fork and shared copy-on-write
+preload_app = os.environ.get("PRELOAD_APP", "true") == "true"
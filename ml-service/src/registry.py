@@ -0,0 +1,126 @@
+import os
+import time
+import traceback
+from datetime import datetime, timezone
+from hashlib import sha256
+from sys import stderr
+from threading import Lock
+
+from src.config import MODEL_CHECK_INTERVAL
+
+
+class LoadedModel:
+    """A deserialized model with the file version it was loaded from"""
+
+    def __init__(self, model, version, stat, loaded_at, load_seconds):
+        self.model = model
+        self.version = version
+        self.stat = stat
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+
+
+def get_file_stat(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_file_version(path):
+    digest = sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelRegistry:
+    """
+    Keeps one instance of a model per process.
+
+    The model file is checked at most once per interval and reloaded when
+    its modification time or size changes. The new instance is built
+    before it replaces the current one, which keeps serving until then,
+    and also when the new file fails to load.
+
+    Optional files may not exist yet, in which case there is no model
+    until they are deployed.
+    """
+
+    def __init__(self, path, load, check_interval=MODEL_CHECK_INTERVAL, optional=False):
+        self.path = path
+        self.optional = optional
+        self.load_model = load
+        self.check_interval = check_interval
+        self.loaded = None
+        self.checked_at = 0
+        self.reload_count = 0
+        self.last_error = None
+        self.lock = Lock()
+
+    def load(self):
+        started_at = time.monotonic()
+        stat = get_file_stat(self.path)
+        version = get_file_version(self.path)
+        model = self.load_model(self.path)
+        loaded = LoadedModel(
+            model,
+            version,
+            stat,
+            datetime.now(timezone.utc),
+            time.monotonic() - started_at,
+        )
+        if self.loaded is not None:
+            self.reload_count += 1
+        self.loaded = loaded
+        self.last_error = None
+        return loaded
+
+    def refresh(self):
+        with self.lock:
+            checked_at = time.monotonic()
+            is_checked = self.loaded or self.optional
+            if is_checked and checked_at - self.checked_at < self.check_interval:
+                return self.loaded
+            try:
+                if self.loaded is None or get_file_stat(self.path) != self.loaded.stat:
+                    self.load()
+            except Exception as e:
+                if not (self.optional and isinstance(e, FileNotFoundError)):
+                    self.last_error = str(e)
+                    print(f"ModelLoadError: {self.path}: {e}", file=stderr)
+                    print(traceback.format_exc(), file=stderr)
+                if self.loaded is None and not self.optional:
+                    raise
+            self.checked_at = checked_at
+            return self.loaded
+
+    def get_versioned(self):
+        """Returns the model with the version of the file it was loaded from"""
+        loaded = self.loaded
+        is_checked = loaded or self.optional
+        if not (is_checked and time.monotonic() - self.checked_at < self.check_interval):
+            loaded = self.refresh()
+        return (loaded.model, loaded.version) if loaded else None
+
+    def get(self):
+        current = self.get_versioned()
+        return current[0] if current else None
+
+    def get_metrics(self):
+        loaded = self.loaded
+        return {
+            "path": self.path,
+            "optional": self.optional,
+            "version": loaded.version if loaded else None,
+            "loaded_at": loaded.loaded_at.isoformat() if loaded else None,
+            "load_seconds": loaded.load_seconds if loaded else None,
+            "reload_count": self.reload_count,
+            "last_error": self.last_error,
+        }
+
+    def preload(self):
+        """Loads the model at startup, failures are retried on first use"""
+        try:
+            self.refresh()
+        except Exception:
+            pass
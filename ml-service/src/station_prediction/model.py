@@ -5,6 +5,7 @@ from sklearn.tree import *
 from scipy.optimize import minimize
 
 from src.config import STATION_PREDICTION_MODEL_PATH
+from src.registry import ModelRegistry
 from src.utils import (
     get_charging_sessions_by_zip_code,
     get_stations_by_zip_code,
@@ -12,8 +13,8 @@ from src.utils import (
 
 
 class StationPredictionModel:
-    def __init__(self):
-        self.model = load(STATION_PREDICTION_MODEL_PATH)
+    def __init__(self, path=STATION_PREDICTION_MODEL_PATH):
+        self.model = load(path)
 
     def predict(self, zip_code):
         if not self.model.get(zip_code):
@@ -53,34 +54,35 @@ class StationPredictionModel:
             np.ceil(energy_consumed_sum / 50000)
         )  # Adjust the threshold as needed
 
-        # Objective function to maximize total predicted demand
+        # Objective function to maximize total predicted demand,
+        # predicted for all candidate locations in one model call
         def objective(locations):
-            demand = 0
-            for i in range(0, len(locations), 2):
-                latitude, longitude = locations[i], locations[i + 1]
-                dist = StationPredictionModel._haversine_distance(
-                    latitude,
-                    longitude,
-                    latitude_mean,
-                    longitude_mean,
-                )
-                demand += model.predict([[dist, charging_time_mean]])[0]
-            return -demand
+            coordinates = np.reshape(locations, (-1, 2))
+            dist = StationPredictionModel._haversine_distance(
+                coordinates[:, 0],
+                coordinates[:, 1],
+                latitude_mean,
+                longitude_mean,
+            )
+            features = np.column_stack(
+                [dist, np.full(len(coordinates), charging_time_mean)]
+            )
+            return -model.predict(features).sum()
+
+        # Constraint to ensure minimum distance between stations,
+        # counting the pairs of locations that are too close
+        first, second = np.triu_indices(estimated_new_stations, k=1)
 
-        # Constraint to ensure minimum distance between stations
         def constraint(locations):
             min_distance = 5  # Minimum distance between stations in km
-            num_constraints = 0
-            for i in range(0, len(locations), 2):
-                for j in range(i + 2, len(locations), 2):
-                    lat1, lon1 = locations[i], locations[i + 1]
-                    lat2, lon2 = locations[j], locations[j + 1]
-                    distance = StationPredictionModel._haversine_distance(
-                        lat1, lon1, lat2, lon2
-                    )
-                    if distance < min_distance:
-                        num_constraints += 1
-            return num_constraints
+            coordinates = np.reshape(locations, (-1, 2))
+            distance = StationPredictionModel._haversine_distance(
+                coordinates[first, 0],
+                coordinates[first, 1],
+                coordinates[second, 0],
+                coordinates[second, 1],
+            )
+            return np.count_nonzero(distance < min_distance)
 
         locations = []
         if estimated_new_stations > 0:
@@ -129,3 +131,9 @@ class StationPredictionModel:
         )
         c = 2 * np.arcsin(np.sqrt(a))
         return R * c
+
+
+# Loaded once per process, before forking when gunicorn preloads the app
+station_prediction_model = ModelRegistry(
+    STATION_PREDICTION_MODEL_PATH, StationPredictionModel
+)
@@ -1,18 +1,23 @@
 import pickle
+import numpy as np
 import pandas as pd
 import os
 
-from src.config import WAIT_TIME_MODEL_PATH
+from src.config import WAIT_TIME_MODEL_PATH, WAIT_TIME_BATCH_CHUNK_SIZE
+from src.registry import ModelRegistry
+
+# Features of the model, in training order
+FEATURES = ['evse_id', 'station_id', 'latitude', 'longitude', 'hour_of_day', 'day_of_week']
 
 class WaitTimeModel:
-    def __init__(self):
+    def __init__(self, path=WAIT_TIME_MODEL_PATH):
         # Load the model once when the class is initialized
-        with open(WAIT_TIME_MODEL_PATH, 'rb') as f:
+        with open(path, 'rb') as f:
             self.model = pickle.load(f)
 
     def predict(self, evse_id, station_id, latitude, longitude, hour_of_day, day_of_week, elapsed_time):
-        # Create the input DataFrame
-        input_data = {
+        # Create the input columns
+        features = {
             'evse_id': [evse_id],
             'station_id': [station_id],
             'latitude': [latitude],
@@ -21,11 +26,30 @@ class WaitTimeModel:
             'day_of_week': [day_of_week]
         }
 
-        df = pd.DataFrame(input_data, columns=['evse_id', 'station_id', 'latitude', 'longitude', 'hour_of_day', 'day_of_week'])
-
         # Predict the total duration
-        predicted_total = self.model.predict(df)[0]
+        predicted_total = self.predict_batch(features)[0]
 
         # Compute wait time
         # wait_time_estimate = predicted_total - elapsed_time
         return predicted_total
+
+    def predict_batch(self, features, chunk_size=WAIT_TIME_BATCH_CHUNK_SIZE):
+        """Predicts the total duration of every row of the feature columns
+
+        Rows are predicted chunk by chunk, one model call per chunk, so
+        the DataFrames built for a large batch stay bounded.
+        """
+        size = len(features['evse_id'])
+        predictions = []
+        for start in range(0, size, chunk_size):
+            chunk = {name: features[name][start:start + chunk_size] for name in FEATURES}
+            df = pd.DataFrame(chunk, columns=FEATURES)
+            predictions.append(self.model.predict(df))
+        if not predictions:
+            return []
+        return np.concatenate(predictions).tolist()
+
+
+# Loaded once per process, before forking when gunicorn preloads the app
+wait_time_model = ModelRegistry(WAIT_TIME_MODEL_PATH, WaitTimeModel)
+
@@ -0,0 +1,73 @@
+from src.config import WAIT_TIME_CACHE_MAXSIZE, WAIT_TIME_CACHE_TTL
+from src.utils import TTLCache
+from src.wait_time.model import FEATURES, wait_time_model
+from src.wait_time.table import wait_time_table
+
+
+class PredictionCache(TTLCache):
+    """TTLCache of predictions counting its hits and misses"""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize, ttl)
+        self.hits = 0
+        self.misses = 0
+        self.table_hits = 0
+
+    def count(self, hits, misses, table_hits=0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.table_hits += table_hits
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "table_hits": self.table_hits,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+            }
+
+
+# Predicted total durations keyed by model version and feature tuple
+prediction_cache = PredictionCache(WAIT_TIME_CACHE_MAXSIZE, WAIT_TIME_CACHE_TTL)
+
+
+def predict_wait_times(features):
+    """Predicts the wait times of the feature columns
+
+    Rows are read from the precomputed table when it was built by the
+    current model version, then from the cache when the same features
+    were predicted by that version. Only the remaining rows are sent to
+    the model, in one batch.
+    """
+    model, version = wait_time_model.get_versioned()
+    rows = list(zip(*(features[name] for name in FEATURES)))
+    wait_times = [None] * len(rows)
+
+    table = wait_time_table.get() if wait_time_table else None
+    if table and table.model_version == version:
+        wait_times = [table.lookup(*row) for row in rows]
+    table_hits = len(rows) - wait_times.count(None)
+
+    keys = [(version, *row) for row in rows]
+    for index, key in enumerate(keys):
+        if wait_times[index] is None:
+            wait_times[index] = prediction_cache.get(key)
+    cache_lookups = len(rows) - table_hits
+
+    missing = [index for index, wait_time in enumerate(wait_times) if wait_time is None]
+    if missing:
+        missing_features = {
+            name: [features[name][index] for index in missing] for name in FEATURES
+        }
+        predictions = model.predict_batch(missing_features)
+        for index, prediction in zip(missing, predictions):
+            wait_times[index] = prediction
+            prediction_cache.set(keys[index], prediction)
+
+    prediction_cache.count(cache_lookups - len(missing), len(missing), table_hits)
+    return wait_times
@@ -0,0 +1,162 @@
+import argparse
+import os
+import time
+import traceback
+import numpy as np
+from sys import stderr
+
+from src.config import mongo, WAIT_TIME_TABLE_PATH
+from src.registry import ModelRegistry
+from src.wait_time.model import FEATURES, wait_time_model
+
+DAYS_PER_WEEK = 7
+HOURS_PER_DAY = 24
+
+# EVSE features besides the time slot, stored on the table rows
+EVSE_FIELDS = ["evse_id", "station_id", "latitude", "longitude"]
+
+# Keys of the table rows, the location is only stored with them
+KEY_FIELDS = ["evse_id", "station_id"]
+
+# Decimal places of the station coordinates, DECIMAL(9,6) in MySQL
+COORDINATE_PRECISION = 6
+
+# One row per EVSE, tagged with the version of the model that predicted it
+TABLE_DTYPE = np.dtype(
+    [
+        ("evse_id", np.int64),
+        ("station_id", np.int64),
+        ("latitude", np.float64),
+        ("longitude", np.float64),
+        ("model_version", "S12"),
+        ("wait_times", np.float32, (DAYS_PER_WEEK, HOURS_PER_DAY)),
+    ]
+)
+
+
+class WaitTimeTable:
+    """Memory-mapped wait time predictions per EVSE, weekday and hour"""
+
+    def __init__(self, path):
+        self.rows = np.load(path, mmap_mode="r")
+        self.model_version = (
+            self.rows["model_version"][0].decode() if len(self.rows) else None
+        )
+        keys = zip(*(self.rows[field].tolist() for field in KEY_FIELDS))
+        self.index = {key: position for position, key in enumerate(keys)}
+
+    def lookup(self, evse_id, station_id, latitude, longitude, hour_of_day, day_of_week):
+        position = self.index.get((evse_id, station_id))
+        if position is None:
+            return None
+        # Predictions for another location are left to the model
+        row = self.rows[position]
+        location = (round(latitude, COORDINATE_PRECISION), round(longitude, COORDINATE_PRECISION))
+        if (float(row["latitude"]), float(row["longitude"])) != location:
+            return None
+        if not (0 <= hour_of_day < HOURS_PER_DAY and 0 <= day_of_week < DAYS_PER_WEEK):
+            return None
+        return float(self.rows["wait_times"][position, day_of_week, hour_of_day])
+
+
+# Reloaded when the job replaces the file, absent until it first runs
+wait_time_table = None
+if WAIT_TIME_TABLE_PATH:
+    wait_time_table = ModelRegistry(WAIT_TIME_TABLE_PATH, WaitTimeTable, optional=True)
+
+
+def get_evses():
+    """Returns the EVSEs with charging sessions, with their latest locations"""
+    pipeline = [
+        {"$sort": {"_id": -1}},
+        {
+            "$group": {
+                "_id": {"evse_id": "$evse_id", "station_id": "$station_id"},
+                "latitude": {"$first": "$latitude"},
+                "longitude": {"$first": "$longitude"},
+            }
+        },
+        {"$sort": {"_id.evse_id": 1, "_id.station_id": 1}},
+    ]
+    evses = []
+    for evse in mongo.charging_sessions.aggregate(pipeline):
+        if None in (evse["latitude"], evse["longitude"], *evse["_id"].values()):
+            continue
+        # Rounded as lookups are, so the stored location compares equal
+        latitude = round(float(evse["latitude"]), COORDINATE_PRECISION)
+        longitude = round(float(evse["longitude"]), COORDINATE_PRECISION)
+        evses.append({**evse["_id"], "latitude": latitude, "longitude": longitude})
+    return evses
+
+
+def build_table(evses):
+    """
+    Predicts the wait time of every EVSE for every weekday and hour.
+    :param evses: The EVSEs, with the EVSE_FIELDS.
+    :return: The table rows, as a TABLE_DTYPE array.
+    """
+    model, version = wait_time_model.get_versioned()
+    slots = DAYS_PER_WEEK * HOURS_PER_DAY
+
+    rows = np.zeros(len(evses), dtype=TABLE_DTYPE)
+    for field in EVSE_FIELDS:
+        rows[field] = [evse[field] for evse in evses]
+    rows["model_version"] = version
+
+    # Features of every slot, EVSE by EVSE, weekdays then hours
+    features = {field: np.repeat(rows[field], slots) for field in EVSE_FIELDS}
+    features["day_of_week"] = np.tile(np.repeat(np.arange(DAYS_PER_WEEK), HOURS_PER_DAY), len(evses))
+    features["hour_of_day"] = np.tile(np.arange(HOURS_PER_DAY), DAYS_PER_WEEK * len(evses))
+    features = {field: features[field] for field in FEATURES}
+
+    predictions = model.predict_batch(features)
+    rows["wait_times"] = np.asarray(predictions, dtype=np.float32).reshape(
+        len(evses), DAYS_PER_WEEK, HOURS_PER_DAY
+    )
+    return rows
+
+
+def write_table(rows, path):
+    # Replaced atomically, so workers never map a partially written file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        np.save(file, rows)
+    os.replace(temp_path, path)
+
+
+def refresh_table():
+    evses = get_evses()
+    rows = build_table(evses)
+    write_table(rows, WAIT_TIME_TABLE_PATH)
+    print(f"Wrote wait times of {len(rows)} EVSEs to {WAIT_TIME_TABLE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute wait time predictions per EVSE, weekday and hour"
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=0,
+        help="Seconds between refreshes, runs once when 0",
+    )
+    args = parser.parse_args()
+    if not WAIT_TIME_TABLE_PATH:
+        parser.error("WAIT_TIME_TABLE_PATH is not set")
+
+    while True:
+        try:
+            refresh_table()
+        except Exception as e:
+            print(f"WaitTimeTableError: {e}", file=stderr)
+            print(traceback.format_exc(), file=stderr)
+            if not args.interval:
+                raise
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 from flask import Flask, request
 from flask_cors import CORS
+from sys import stderr
 
 # Internal Modules
 from src.config import WEB_DOMAINS
 from src.middlewares import auth
+from src.middlewares import cache
 from src.controllers import site
 from src.controllers import station
 from src.controllers import evse
+from src.repositories.utils import transaction, warm_up_fields
 
 
 # Flash App
@@ -14,10 +17,17 @@ app = Flask(__name__)
 app.json.sort_keys = False
 CORS(app, resources={r"/api/*": {"origins": WEB_DOMAINS}})
 
+# Load column metadata before serving requests
+try:
+    transaction(warm_up_fields)
+except Exception as e:
+    print(f"WarmUpError: {e}", file=stderr)
+
 
 ########## Site Management Routes
 @app.route("/api/sites", methods=["GET"])
 @auth.require_permission("anonymous", "staff", "owner", "driver")
+@cache.cache_response
 def get_sites():
     return site.get_sites()
 
@@ -55,6 +65,7 @@ def delete_site(site_id):
 ########## Station Management Routes
 @app.route("/api/stations", methods=["GET"])
 @auth.require_permission("anonymous", "staff", "owner", "driver")
+@cache.cache_response
 def get_stations():
     return station.get_stations()
 
@@ -86,6 +97,7 @@ def delete_station(station_id):
 ########## EVSE Management Routes
 @app.route("/api/stations/evses", methods=["GET"])
 @auth.require_permission("anonymous", "staff", "owner", "driver")
+@cache.cache_response
 def get_evses():
     return evse.get_evses()
 
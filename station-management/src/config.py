@@ -2,7 +2,7 @@ import os
 import dotenv
 import pymysql
 from dbutils.pooled_db import PooledDB
-from geoip2 import webservice
+from geoip2 import database, webservice
 from sqlalchemy.engine.url import make_url
 
 from datetime import datetime
@@ -18,8 +18,21 @@ PORT = os.environ["PORT"]
 WEB_DOMAINS = os.environ["WEB_DOMAINS"].split(",") or "*"
 AUTH_API = os.environ["AUTH_API"]
 MYSQL_URI = os.environ["MYSQL_URI"]
-GEOIP_ACCOUNT_ID = os.environ["GEOIP_ACCOUNT_ID"]
-GEOIP_LICENSE_KEY = os.environ["GEOIP_LICENSE_KEY"]
+GEOIP_ACCOUNT_ID = os.environ.get("GEOIP_ACCOUNT_ID")
+GEOIP_LICENSE_KEY = os.environ.get("GEOIP_LICENSE_KEY")
+GEOIP_DATABASE_PATH = os.environ.get("GEOIP_DATABASE_PATH")
+GEO_CACHE_MAXSIZE = int(os.environ.get("GEO_CACHE_MAXSIZE", 10000))
+GEO_CACHE_TTL = int(os.environ.get("GEO_CACHE_TTL", 86400))
+GEO_CACHE_NEGATIVE_TTL = int(os.environ.get("GEO_CACHE_NEGATIVE_TTL", 600))
+AUTH_JWT_SECRET = os.environ.get("AUTH_JWT_SECRET")
+AUTH_CACHE_MAXSIZE = int(os.environ.get("AUTH_CACHE_MAXSIZE", 10000))
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_NEGATIVE_TTL = int(os.environ.get("AUTH_CACHE_NEGATIVE_TTL", 30))
+EVSE_CATALOG_ENABLED = os.environ.get("EVSE_CATALOG_ENABLED", "false") == "true"
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", 5))
+CATALOG_RELOAD_INTERVAL = float(os.environ.get("CATALOG_RELOAD_INTERVAL", 30))
+RESPONSE_CACHE_MAXSIZE = int(os.environ.get("RESPONSE_CACHE_MAXSIZE", 1000))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
 
 
 def convert_datetime(x):
@@ -46,8 +59,11 @@ mysql = PooledDB(
 )
 
 # GeoIP Configuration
-geo_client = webservice.Client(
-    GEOIP_ACCOUNT_ID,
-    GEOIP_LICENSE_KEY,
-    "geolite.info",
-)
+geo_client = None
+if GEOIP_ACCOUNT_ID and GEOIP_LICENSE_KEY:
+    geo_client = webservice.Client(
+        GEOIP_ACCOUNT_ID,
+        GEOIP_LICENSE_KEY,
+        "geolite.info",
+    )
+geo_reader = database.Reader(GEOIP_DATABASE_PATH) if GEOIP_DATABASE_PATH else None
@@ -4,6 +4,7 @@ from flask import request
 from src.controllers.utils import (
     extract_args_search,
     extract_args_lat_lng,
+    extract_args_nearest,
     extract_args_select,
     extract_args_sort_by,
 )
@@ -20,6 +21,7 @@ def get_evses():
             filter["owner_id"] = request.auth["user_id"]
         filter.update(extract_args_search(filter))
         filter.update(extract_args_lat_lng(filter))
+        filter.update(extract_args_nearest(filter))
         select = extract_args_select(filter.get("fields"))
         sort = extract_args_sort_by(filter.get("sort_by"))
         limit = int(filter.get("limit") or 0) or None
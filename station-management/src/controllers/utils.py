@@ -31,6 +31,8 @@ def extract_args_lat_lng(args):
         lng_origin = float(geo_data.get("longitude") or lng_origin)
         lat_lng_data["lat_lng_origin"] = f"{lat_origin},{lng_origin}"
         lat_lng_delta = Constants.Lat_lng_delta.value
+        if args.get("nearest"):
+            return lat_lng_data
         if not args.get("lat_lng_max"):
             lat_max = lat_origin + lat_lng_delta
             lng_max = lng_origin + lat_lng_delta
@@ -42,6 +44,20 @@ def extract_args_lat_lng(args):
     return lat_lng_data
 
 
+def extract_args_nearest(args):
+    if args.get("nearest"):
+        try:
+            nearest = int(args.get("nearest"))
+        except ValueError:
+            raise Exception("Invalid nearest value", 400)
+        if nearest <= 0:
+            raise Exception("Invalid nearest value", 400)
+        if not args.get("lat_lng_origin"):
+            raise Exception("lat_lng_origin is required", 400)
+        return {"nearest": nearest}
+    return {}
+
+
 def extract_args_select(fields):
     select = {}
     if fields:
@@ -0,0 +1,66 @@
+from flask import current_app, request
+from functools import wraps
+from hashlib import sha256
+from sys import stderr
+
+# Internal Modules
+from src.config import RESPONSE_CACHE_MAXSIZE, RESPONSE_CACHE_TTL
+from src.repositories.catalog import catalog_version
+from src.utils import TTLCache, get_client_ip_address, get_ip_prefix
+
+# Serialized responses keyed by request, tagged with the catalog version
+response_cache = TTLCache(RESPONSE_CACHE_MAXSIZE, RESPONSE_CACHE_TTL)
+
+
+def get_cache_key():
+    args = tuple(sorted(request.args.items(multi=True)))
+    auth = request.auth
+    owner_id = auth.get("user_id") if auth["role"] == "owner" else None
+    # The default origin is located from the client network
+    client = None
+    if request.args.get("lat_lng_origin") == "default":
+        client = get_ip_prefix(get_client_ip_address()) or "me"
+    return (request.path, args, auth["role"], owner_id, client)
+
+
+def create_response(body, etag):
+    response = current_app.response_class(body, 200, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cache_response(f):
+    """Serve GET results from cache with ETag based revalidation
+
+    The ETag is derived from the catalog version and the cache key, so
+    it changes whenever sites, stations or EVSEs change.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            version = catalog_version.get()
+        except Exception as e:
+            print(f"CatalogVersionError: {e}", file=stderr)
+            version = None
+        if version is None:
+            return f(*args, **kwargs)
+
+        key = get_cache_key()
+        etag = sha256(repr((version, key)).encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        body = response_cache.get(key + (version,))
+        if body is None:
+            data, status_code = f(*args, **kwargs)
+            if status_code != 200:
+                return data, status_code
+            body = current_app.json.dumps(data)
+            response_cache.set(key + (version,), body)
+        return create_response(body, etag)
+
+    return decorated_function
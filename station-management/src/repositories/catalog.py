@@ -0,0 +1,350 @@
+import math
+import sys
+import time
+from threading import Lock
+
+# Internal Modules
+from src.config import (
+    EVSE_CATALOG_ENABLED,
+    CATALOG_CHECK_INTERVAL,
+    CATALOG_RELOAD_INTERVAL,
+)
+from src.utils import Constants, urlsafe_b64_json_decode
+from src.repositories.utils import (
+    Table,
+    transaction,
+    commit_listeners,
+    get_fields,
+    get_projection,
+    parse_lat_lng,
+    create_cursor,
+)
+
+# Fields with a position index, besides the geo cells
+INDEXED_FIELDS = ["owner_id", "station_id", "site_id"]
+
+# Mean earth radius used by ST_Distance_Sphere in the SQL queries
+EARTH_RADIUS_KM = 6371
+
+
+def normalize(value):
+    # Strings compare case-insensitively, like the table collation
+    return value.casefold() if isinstance(value, str) else value
+
+
+def coerce(value, sample):
+    if isinstance(sample, bool) or sample is None:
+        return value
+    if isinstance(sample, int):
+        return int(value)
+    if isinstance(sample, float):
+        return float(value)
+    return str(value)
+
+
+def haversine(lat_origin, lng_origin, lat, lng):
+    lat_origin, lng_origin = math.radians(lat_origin), math.radians(lng_origin)
+    lat, lng = math.radians(lat), math.radians(lng)
+    a = (
+        math.sin((lat - lat_origin) / 2) ** 2
+        + math.cos(lat_origin) * math.cos(lat) * math.sin((lng - lng_origin) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1)))
+
+
+def get_cell(lat, lng):
+    size = Constants.Lat_lng_delta.value
+    return math.floor(lat / size), math.floor(lng / size)
+
+
+class EvseSnapshot:
+    """Columnar copy of evses_materialized at one catalog version
+
+    Rows are addressed by position. Positions are indexed by owner,
+    station and site, and by geo cells of Lat_lng_delta degrees.
+    """
+
+    def __init__(self, version, fields, rows):
+        self.version = version
+        self.fields = fields
+        self.size = len(rows)
+        self.columns = {}
+        for field in fields:
+            column = [row[field] for row in rows]
+            if any(isinstance(value, str) for value in column):
+                column = [
+                    sys.intern(value) if isinstance(value, str) else value
+                    for value in column
+                ]
+            self.columns[field] = column
+        self.samples = {
+            field: next((value for value in column if value is not None), None)
+            for field, column in self.columns.items()
+        }
+
+        self.indexes = {}
+        for field in INDEXED_FIELDS:
+            index = {}
+            for position, value in enumerate(self.columns.get(field, [])):
+                index.setdefault(value, []).append(position)
+            self.indexes[field] = index
+
+        self.cells = {}
+        latitudes = self.columns.get("latitude", [])
+        longitudes = self.columns.get("longitude", [])
+        for position, (lat, lng) in enumerate(zip(latitudes, longitudes)):
+            if lat is not None and lng is not None:
+                self.cells.setdefault(get_cell(lat, lng), []).append(position)
+
+    def get_equal(self, filter):
+        equal = {}
+        for field, value in filter.items():
+            if field in self.columns and value:
+                try:
+                    equal[field] = normalize(coerce(value, self.samples[field]))
+                except (TypeError, ValueError):
+                    return None
+        return equal
+
+    def get_candidates(self, equal, lat_lng_min, lat_lng_max):
+        candidates = None
+        for field in INDEXED_FIELDS:
+            if field in equal:
+                positions = self.indexes[field].get(equal[field], [])
+                if candidates is None or len(positions) < len(candidates):
+                    candidates = positions
+        if candidates is None and lat_lng_min and lat_lng_max:
+            cell_min = get_cell(*lat_lng_min)
+            cell_max = get_cell(*lat_lng_max)
+            cell_count = (cell_max[0] - cell_min[0] + 1) * (cell_max[1] - cell_min[1] + 1)
+            if 0 < cell_count <= len(self.cells):
+                candidates = []
+                for lat_cell in range(cell_min[0], cell_max[0] + 1):
+                    for lng_cell in range(cell_min[1], cell_max[1] + 1):
+                        candidates.extend(self.cells.get((lat_cell, lng_cell), []))
+                candidates.sort()
+        return range(self.size) if candidates is None else candidates
+
+    def filter_positions(self, candidates, equal, lat_lng_min, lat_lng_max):
+        latitudes = self.columns.get("latitude")
+        longitudes = self.columns.get("longitude")
+        positions = []
+        for position in candidates:
+            is_match = all(
+                normalize(self.columns[field][position]) == value
+                for field, value in equal.items()
+            )
+            if is_match and (lat_lng_min or lat_lng_max):
+                lat, lng = latitudes[position], longitudes[position]
+                if lat is None or lng is None:
+                    is_match = False
+                elif lat_lng_min and (lat < lat_lng_min[0] or lng < lat_lng_min[1]):
+                    is_match = False
+                elif lat_lng_max and (lat > lat_lng_max[0] or lng > lat_lng_max[1]):
+                    is_match = False
+            if is_match:
+                positions.append(position)
+        return positions
+
+    def get_value(self, position, field, distances):
+        if field == "distance":
+            return distances.get(position)
+        return self.columns[field][position]
+
+    def is_after_cursor(self, position, keys, distances):
+        for field, value, is_desc in keys:
+            row_value = normalize(self.get_value(position, field, distances))
+            if row_value is None:
+                return False
+            try:
+                if row_value == value:
+                    continue
+                return row_value < value if is_desc else row_value > value
+            except TypeError:
+                return False
+        return False
+
+    def sort_positions(self, positions, sort_keys, distances):
+        # Stable sorts from the last key to the first, NULLs sort lowest
+        for field, is_desc in sort_keys[::-1]:
+
+            def key(position):
+                value = normalize(self.get_value(position, field, distances))
+                return (False,) if value is None else (True, value)
+
+            positions.sort(key=key, reverse=is_desc)
+        return positions
+
+    def get_evses(self, filter={}, select={}, sort={}, limit=None, cursor=None):
+        field_list = list(self.fields)
+        projection = get_projection(select, field_list) or field_list
+
+        lat_lng_min = filter.get("lat_lng_min")
+        lat_lng_min = parse_lat_lng(lat_lng_min) if lat_lng_min else None
+        lat_lng_max = filter.get("lat_lng_max")
+        lat_lng_max = parse_lat_lng(lat_lng_max) if lat_lng_max else None
+
+        equal = self.get_equal(filter)
+        if equal is None:
+            return {"data": [], "cursor": {"next": ""}}
+        candidates = self.get_candidates(equal, lat_lng_min, lat_lng_max)
+        positions = self.filter_positions(candidates, equal, lat_lng_min, lat_lng_max)
+
+        distances = {}
+        lat_lng_origin = filter.get("lat_lng_origin")
+        if lat_lng_origin:
+            lat_origin, lng_origin = parse_lat_lng(lat_lng_origin)
+            latitudes = self.columns["latitude"]
+            longitudes = self.columns["longitude"]
+            for position in positions:
+                lat, lng = latitudes[position], longitudes[position]
+                if lat is not None and lng is not None:
+                    distances[position] = haversine(lat_origin, lng_origin, lat, lng)
+            projection = [*projection, "distance"]
+            field_list.append("distance")
+
+        nearest = filter.get("nearest")
+        if nearest and lat_lng_origin:
+            positions = self.sort_positions(
+                positions, [("distance", False), ("id", False)], distances
+            )
+            evses = [self.get_row(p, projection, distances) for p in positions[:nearest]]
+            return {"data": evses, "cursor": {"next": ""}}
+
+        field_set = set(field_list)
+        if sort and cursor:
+            payload = urlsafe_b64_json_decode(cursor)
+            keys = []
+            for field, order in sort.items():
+                value = payload.get(field)
+                if field in field_set and value:
+                    keys.append((field, normalize(value), order == -1))
+            if keys:
+                positions = [
+                    position
+                    for position in positions
+                    if self.is_after_cursor(position, keys, distances)
+                ]
+
+        if sort:
+            sort_keys = [
+                (field, order == -1) for field, order in sort.items() if field in field_set
+            ]
+            positions = self.sort_positions(positions, sort_keys, distances)
+
+        if limit and limit > 0:
+            positions = positions[:limit]
+
+        evses = [self.get_row(p, projection, distances) for p in positions]
+        return {
+            "data": evses,
+            "cursor": create_cursor(evses, sort, limit),
+        }
+
+    def get_row(self, position, projection, distances):
+        return {
+            field: self.get_value(position, field, distances) for field in projection
+        }
+
+
+class CatalogVersion:
+    """Version of the site, station and EVSE data
+
+    The version is bumped by the database triggers on every change. It
+    is checked at most once per interval, and right away after this
+    process commits a change.
+    """
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = 0
+        self.generation = 0
+        self.lock = Lock()
+
+    def invalidate(self):
+        self.generation += 1
+        self.checked_at = 0
+
+    def fetch(self, connection):
+        query = "SELECT version FROM catalog_version WHERE id = 1"
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            row = cursor.fetchone()
+        return row["version"] if row else None
+
+    def get(self, connection=None):
+        if time.monotonic() - self.checked_at < self.check_interval:
+            return self.version
+        with self.lock:
+            checked_at = time.monotonic()
+            if checked_at - self.checked_at >= self.check_interval:
+                generation = self.generation
+                if connection:
+                    self.version = self.fetch(connection)
+                else:
+                    self.version = transaction(self.fetch)
+                # A commit during the check invalidates it again
+                if generation == self.generation:
+                    self.checked_at = checked_at
+        return self.version
+
+
+class EvseCatalog:
+    """In-process EVSE snapshot reloaded when the catalog version moves
+
+    Any site, station or EVSE write bumps the version and a reload reads
+    the whole evses_materialized table, so the catalog only suits
+    read-mostly deployments. Reloads are rate-limited to one per
+    interval and run by one request at a time; while the snapshot is
+    stale, the other requests are answered from MySQL.
+    """
+
+    def __init__(self, version, reload_interval):
+        self.version = version
+        self.reload_interval = reload_interval
+        self.snapshot = None
+        self.loaded_at = None
+        self.lock = Lock()
+
+    def load(self, connection, version):
+        table = Table.EvseMaterialized.value
+        fields = get_fields(connection, table)
+        query = f"SELECT {', '.join(fields)} FROM {table} ORDER BY id"
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        return EvseSnapshot(version, fields, rows)
+
+    def get_snapshot(self, connection):
+        version = self.version.get(connection)
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        loaded_at = self.loaded_at
+        if loaded_at and time.monotonic() - loaded_at < self.reload_interval:
+            return None
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            snapshot = self.load(connection, version)
+            self.snapshot = snapshot
+            self.loaded_at = time.monotonic()
+        finally:
+            self.lock.release()
+        return snapshot
+
+    def get_evses(self, connection, filter={}, select={}, sort={}, limit=None, cursor=None):
+        """Returns the EVSEs, or None when the snapshot is stale"""
+        snapshot = self.get_snapshot(connection)
+        if snapshot is None:
+            return None
+        return snapshot.get_evses(filter, select, sort, limit, cursor)
+
+
+catalog_version = CatalogVersion(CATALOG_CHECK_INTERVAL)
+commit_listeners.append(catalog_version.invalidate)
+
+evse_catalog = None
+if EVSE_CATALOG_ENABLED:
+    evse_catalog = EvseCatalog(catalog_version, CATALOG_RELOAD_INTERVAL)
@@ -1,5 +1,6 @@
 from src.repositories.utils import (
     Table,
+    Query,
     get_fields,
     fetch_by_id,
     select_fields,
@@ -8,18 +9,27 @@ from src.repositories.utils import (
     where_fields_equal,
     where_search_match,
     where_lat_lng_range,
-    having_cursor_at,
+    where_cursor_at,
     sort_by_fields,
     limit_at,
+    fetch_nearest,
     create_cursor,
 )
+from src.repositories.catalog import evse_catalog
 
 
 def get_evses(connection, filter={}, select={}, sort={}, limit=None, cursor=None):
-    query_values = []
-    field_list = get_fields(connection, Table.EvseView.value)
+    # Full-text search relies on the MySQL index, everything else is
+    # answered by the in-process catalog when it is enabled and fresh
+    if evse_catalog and not filter.get("search"):
+        evses = evse_catalog.get_evses(connection, filter, select, sort, limit, cursor)
+        if evses is not None:
+            return evses
 
-    query = select_fields(select, field_list)
+    field_list = get_fields(connection, Table.EvseMaterialized.value)
+
+    query = Query(Table.EvseMaterialized.value)
+    query = select_fields(query, select, field_list)
 
     search_fields = [
         "country",
@@ -30,32 +40,34 @@ def get_evses(connection, filter={}, select={}, sort={}, limit=None, cursor=None
         "site_name",
     ]
     search_term = filter.get("search")
-    query = select_search(query, query_values, search_fields, search_term, field_list)
+    query = select_search(query, search_fields, search_term, field_list)
 
     lat_lng_origin = filter.get("lat_lng_origin")
-    query = select_distance(query, query_values, lat_lng_origin, field_list)
-
-    query = f"{query} FROM {Table.EvseView.value}"
+    query = select_distance(query, lat_lng_origin, field_list)
 
-    query = where_fields_equal(query, query_values, filter, field_list)
+    query = where_fields_equal(query, filter, field_list)
 
-    query = where_search_match(query, query_values, search_fields, search_term)
+    query = where_search_match(query, search_fields, search_term)
 
     query = where_lat_lng_range(
         query,
-        query_values,
         filter.get("lat_lng_min"),
         filter.get("lat_lng_max"),
     )
 
-    query = having_cursor_at(query, query_values, sort, cursor)
+    nearest = filter.get("nearest")
+    if nearest and lat_lng_origin:
+        evses = fetch_nearest(connection, query, lat_lng_origin, nearest)
+        return {"data": evses, "cursor": {"next": ""}}
+
+    query = where_cursor_at(query, sort, cursor, field_list)
 
     query = sort_by_fields(query, sort, field_list)
 
     query = limit_at(query, limit)
 
     with connection.cursor() as cursor:
-        cursor.execute(query, query_values)
+        query.execute(cursor)
         evses = cursor.fetchall()
 
     return {
@@ -65,38 +77,36 @@ def get_evses(connection, filter={}, select={}, sort={}, limit=None, cursor=None
 
 
 def get_evse_count(connection, filter={}):
-    query_values = []
-
-    query = f"SELECT count(*) as count FROM {Table.EvseView.value}"
+    query = Query(Table.EvseMaterialized.value)
+    query.select("count(*) as count")
 
-    field_list = get_fields(connection, Table.EvseView.value)
-    query = where_fields_equal(query, query_values, filter, field_list)
+    field_list = get_fields(connection, Table.EvseMaterialized.value)
+    query = where_fields_equal(query, filter, field_list)
 
     search_fields = ["site_name", "street_address", "city"]
     search_term = filter.get("search")
-    query = where_search_match(query, query_values, search_fields, search_term)
+    query = where_search_match(query, search_fields, search_term)
 
     query = where_lat_lng_range(
         query,
-        query_values,
         filter.get("lat_lng_min"),
         filter.get("lat_lng_max"),
     )
 
     with connection.cursor() as cursor:
-        cursor.execute(query, query_values)
+        query.execute(cursor)
         evse = cursor.fetchone()
 
     return evse
 
 
 def get_evse_by_id(connection, entry_id):
-    return fetch_by_id(connection, Table.EvseView.value, entry_id)
+    return fetch_by_id(connection, Table.EvseMaterialized.value, entry_id)
 
 
 def get_evse_by_ids(connection, station_id, evse_id):
     query = f"""
-        SELECT * FROM {Table.EvseView.value}
+        SELECT * FROM {Table.EvseMaterialized.value}
         WHERE station_id = %s AND evse_id = %s
     """
     with connection.cursor() as cursor:
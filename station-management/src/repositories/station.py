@@ -1,5 +1,6 @@
 from src.repositories.utils import (
     Table,
+    Query,
     get_fields,
     fetch_by_id,
     select_fields,
@@ -8,18 +9,19 @@ from src.repositories.utils import (
     where_fields_equal,
     where_search_match,
     where_lat_lng_range,
-    having_cursor_at,
+    where_cursor_at,
     sort_by_fields,
     limit_at,
+    fetch_nearest,
     create_cursor,
 )
 
 
 def get_stations(connection, filter={}, select={}, sort={}, limit=None, cursor=None):
-    query_values = []
-    field_list = get_fields(connection, Table.StationView.value)
+    field_list = get_fields(connection, Table.StationMaterialized.value)
 
-    query = select_fields(select, field_list)
+    query = Query(Table.StationMaterialized.value)
+    query = select_fields(query, select, field_list)
 
     search_fields = [
         "country",
@@ -30,32 +32,34 @@ def get_stations(connection, filter={}, select={}, sort={}, limit=None, cursor=N
         "site_name",
     ]
     search_term = filter.get("search")
-    query = select_search(query, query_values, search_fields, search_term, field_list)
+    query = select_search(query, search_fields, search_term, field_list)
 
     lat_lng_origin = filter.get("lat_lng_origin")
-    query = select_distance(query, query_values, lat_lng_origin, field_list)
+    query = select_distance(query, lat_lng_origin, field_list)
 
-    query = f"{query} FROM {Table.StationView.value}"
+    query = where_fields_equal(query, filter, field_list)
 
-    query = where_fields_equal(query, query_values, filter, field_list)
-
-    query = where_search_match(query, query_values, search_fields, search_term)
+    query = where_search_match(query, search_fields, search_term)
 
     query = where_lat_lng_range(
         query,
-        query_values,
         filter.get("lat_lng_min"),
         filter.get("lat_lng_max"),
     )
 
-    query = having_cursor_at(query, query_values, sort, cursor)
+    nearest = filter.get("nearest")
+    if nearest and lat_lng_origin:
+        stations = fetch_nearest(connection, query, lat_lng_origin, nearest)
+        return {"data": stations, "cursor": {"next": ""}}
+
+    query = where_cursor_at(query, sort, cursor, field_list)
 
     query = sort_by_fields(query, sort, field_list)
 
     query = limit_at(query, limit)
 
     with connection.cursor() as cursor:
-        cursor.execute(query, query_values)
+        query.execute(cursor)
         stations = cursor.fetchall()
 
     return {
@@ -65,7 +69,7 @@ def get_stations(connection, filter={}, select={}, sort={}, limit=None, cursor=N
 
 
 def get_station_by_id(connection, station_id):
-    return fetch_by_id(connection, Table.StationView.value, station_id)
+    return fetch_by_id(connection, Table.StationMaterialized.value, station_id)
 
 
 def create_station(connection, station_data):
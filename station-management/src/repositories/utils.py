@@ -1,10 +1,13 @@
 from enum import Enum
 from datetime import datetime
-import re
+from functools import lru_cache
+from pymysql.err import OperationalError
+import math
 
 # Internal Modules
 from src.config import mysql
 from src.utils import (
+    Constants,
     urlsafe_b64_json_encode,
     urlsafe_b64_json_decode,
 )
@@ -14,8 +17,16 @@ class Table(Enum):
     Site = "Site"
     Station = "Station"
     Evse = "EVSE"
-    StationView = "stations_joined"
-    EvseView = "evses_joined"
+    StationMaterialized = "stations_materialized"
+    EvseMaterialized = "evses_materialized"
+
+
+# Kilometers per degree of latitude, on a 6371 km sphere
+KM_PER_DEGREE = 6371 * math.pi / 180
+
+
+# Callbacks run after a modifying transaction is committed
+commit_listeners = []
 
 
 def transaction(callback, modify=False):
@@ -25,19 +36,45 @@ def transaction(callback, modify=False):
     except Exception as e:
         if modify:
             connection.rollback()
+        if isinstance(e, OperationalError) and e.args[0] == 1054:
+            invalidate_fields()
         raise e
     finally:
         if modify:
             connection.commit()
+            for listener in commit_listeners:
+                listener()
         connection.close()
 
 
+# Column names by table, shared across requests in the process
+table_fields = {}
+
+
 def get_fields(connection, table):
-    query = f"SHOW COLUMNS FROM {table}"
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        data = cursor.fetchall()
-        return [item["Field"] for item in data]
+    fields = table_fields.get(table)
+    if fields is None:
+        query = f"SHOW COLUMNS FROM {table}"
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            data = cursor.fetchall()
+        fields = tuple(
+            item["Field"] for item in data if "INVISIBLE" not in item["Extra"]
+        )
+        table_fields[table] = fields
+    return list(fields)
+
+
+def invalidate_fields(table=None):
+    if table:
+        table_fields.pop(table, None)
+    else:
+        table_fields.clear()
+
+
+def warm_up_fields(connection):
+    for table in Table:
+        get_fields(connection, table.value)
 
 
 def fetch_by_id(connection, table, id):
@@ -47,19 +84,89 @@ def fetch_by_id(connection, table, id):
         return cursor.fetchone()
 
 
-def append_projection(statement="", field="*"):
-    separator = "SELECT " if not statement else ", "
-    return f"{statement}{separator}{field}"
-
-
-def append_condition(statement, condition):
-    hasCondition = re.search("^.*( WHERE ){1}.*$", statement, re.IGNORECASE)
-    separator = "" if not condition else " AND " if hasCondition else " WHERE "
-    return f"{statement}{separator}{condition}"
+class Query:
+    """SELECT statement built clause by clause
+
+    The SQL text only depends on the clauses present (the query shape),
+    so it is compiled once per shape and reused with new values.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.projection = []
+        self.conditions = []
+        self.order = []
+        self.has_limit = False
+        self.select_values = []
+        self.where_values = []
+        self.limit_values = []
+        self.computed = {}
+
+    def select(self, field, values=()):
+        self.projection.append(field)
+        self.select_values.extend(values)
+
+    def select_computed(self, name, expression, values=()):
+        self.computed[name] = (expression, list(values))
+        self.select(f"{expression} as {name}", values)
+
+    def where(self, condition, values=()):
+        self.conditions.append(condition)
+        self.where_values.extend(values)
+
+    def order_by(self, field):
+        self.order.append(field)
+
+    def limit(self, limit):
+        self.has_limit = True
+        self.limit_values = [limit]
+
+    def shape(self):
+        return (
+            self.table,
+            tuple(self.projection),
+            tuple(self.conditions),
+            tuple(self.order),
+            self.has_limit,
+        )
+
+    def compile(self):
+        return compile_query(self.shape())
+
+    def values(self):
+        return [
+            *self.select_values,
+            *self.where_values,
+            *self.limit_values,
+        ]
+
+    def copy(self):
+        query = Query(self.table)
+        for attribute, value in vars(self).items():
+            if isinstance(value, (list, dict)):
+                value = value.copy()
+            setattr(query, attribute, value)
+        return query
+
+    def execute(self, cursor):
+        return cursor.execute(self.compile(), self.values())
+
+
+@lru_cache(maxsize=512)
+def compile_query(shape):
+    table, projection, conditions, order, has_limit = shape
+    statement = f"SELECT {', '.join(projection) or '*'} FROM {table}"
+    if conditions:
+        statement = f"{statement} WHERE {' AND '.join(conditions)}"
+    if order:
+        statement = f"{statement} ORDER BY {', '.join(order)}"
+    if has_limit:
+        statement = f"{statement} LIMIT %s"
+    return statement
 
 
-def select_fields(params={}, table_fields=[]):
-    statement = "*"
+def get_projection(params={}, table_fields=[]):
+    """Fields selected by the include/exclude params, None for all"""
     if params:
         require = ["id", "created_at"]
         include = set(require)
@@ -72,15 +179,19 @@ def select_fields(params={}, table_fields=[]):
         if len(include) > len(require):
             exclude = {field for field in require if field not in exclude}
             include.difference_update(exclude)
-            include = [field for field in table_fields if field in include]
-            statement = ", ".join(include)
+            return [field for field in table_fields if field in include]
         elif len(exclude) < len(table_fields):
-            exclude = [field for field in table_fields if field in exclude]
-            statement = ", ".join(exclude)
-    return append_projection("", statement)
+            return [field for field in table_fields if field in exclude]
+    return None
+
 
+def select_fields(query, params={}, table_fields=[]):
+    projection = get_projection(params, table_fields)
+    query.select(", ".join(projection) if projection else "*")
+    return query
 
-def select_search(statement, values, search_fields, search_term, table_fields=[]):
+
+def select_search(query, search_fields, search_term, table_fields=[]):
     if search_fields and search_term:
         weight_factor = 3
         search_scores = []
@@ -88,87 +199,187 @@ def select_search(statement, values, search_fields, search_term, table_fields=[]
             weight = f"POW({weight_factor}, -{priority})"
             search_score = f"MATCH({field}) AGAINST (%s IN BOOLEAN MODE) * {weight}"
             search_scores.append(search_score)
-            values.append(search_term)
-        search_score = f"({' + '.join(search_scores)}) as search_score"
-        statement = append_projection(statement, search_score)
+        search_score = f"({' + '.join(search_scores)})"
+        values = [search_term] * len(search_fields)
+        query.select_computed("search_score", search_score, values)
         table_fields.append("search_score")
-    return statement
+    return query
 
 
-def select_distance(statement, values, lat_lng_origin, table_fields=[]):
+def select_distance(query, lat_lng_origin, table_fields=[]):
     if lat_lng_origin and len(lat_lng_origin.split(",")) == 2:
-        distance = "haversine(%s, %s, latitude, longitude) as distance"
-        statement = append_projection(statement, distance)
-        values.extend(lat_lng_origin.split(","))
+        lat_origin, lng_origin = lat_lng_origin.split(",")
+        origin = "POINT(%s, %s)"
+        location = "POINT(longitude, latitude)"
+        distance = f"ST_Distance_Sphere({origin}, {location}, 6371000) / 1000"
+        query.select_computed("distance", distance, [lng_origin, lat_origin])
         table_fields.append("distance")
-    return statement
+    return query
 
 
-def where_fields_equal(statement, values, params={}, table_fields=[]):
+def where_fields_equal(query, params={}, table_fields=[]):
     if params:
         field_set = set(table_fields)
         for field, value in params.items():
             if field in field_set and value:
-                statement = append_condition(statement, f"{field} = %s")
-                values.append(value)
-    return statement
+                query.where(f"{field} = %s", [value])
+    return query
 
 
-def where_search_match(statement, values, search_fields, search_term):
+def where_search_match(query, search_fields, search_term):
     if search_fields and search_term:
         condition = f"MATCH ({','.join(search_fields)}) AGAINST(%s IN BOOLEAN MODE)"
-        statement = append_condition(statement, condition)
-        values.append(search_term)
-    return statement
+        query.where(condition, [search_term])
+    return query
 
 
-def where_lat_lng_range(statement, values, lat_lng_min, lat_lng_max):
+def parse_lat_lng(lat_lng):
+    try:
+        lat, lng = lat_lng.split(",")
+        return float(lat), float(lng)
+    except ValueError:
+        raise Exception(f"Invalid coordinates {lat_lng}", 400)
+
+
+def where_location_within(query, lat_lng_min, lat_lng_max):
+    lat_min, lng_min = lat_lng_min
+    lat_max, lng_max = lat_lng_max
+    corners = [
+        (lng_min, lat_min),
+        (lng_max, lat_min),
+        (lng_max, lat_max),
+        (lng_min, lat_max),
+        (lng_min, lat_min),
+    ]
+    polygon = ", ".join(f"{lng} {lat}" for lng, lat in corners)
+    condition = "MBRCovers(ST_GeomFromText(%s), location)"
+    query.where(condition, [f"POLYGON(({polygon}))"])
+    return query
+
+
+def where_lat_lng_range(query, lat_lng_min, lat_lng_max):
+    has_min = lat_lng_min and len(lat_lng_min.split(",")) == 2
+    has_max = lat_lng_max and len(lat_lng_max.split(",")) == 2
+    if has_min and has_max:
+        lat_min, lng_min = parse_lat_lng(lat_lng_min)
+        lat_max, lng_max = parse_lat_lng(lat_lng_max)
+        # MySQL normalizes an inverted rectangle, which would match the
+        # complementary band, so inverted ranges use the comparisons below
+        if lat_min <= lat_max and lng_min <= lng_max:
+            return where_location_within(query, (lat_min, lng_min), (lat_max, lng_max))
     if lat_lng_min and len(lat_lng_min.split(",")) == 2:
         condition = "(latitude >= %s AND longitude >= %s)"
-        statement = append_condition(statement, condition)
-        values.extend(lat_lng_min.split(","))
+        query.where(condition, lat_lng_min.split(","))
     if lat_lng_max and len(lat_lng_max.split(",")) == 2:
         condition = "(latitude <= %s AND longitude <= %s)"
-        statement = append_condition(statement, condition)
-        values.extend(lat_lng_max.split(","))
-    return statement
+        query.where(condition, lat_lng_max.split(","))
+    return query
+
 
+def where_cursor_at(query, sort, cursor, table_fields=[]):
+    """Continue after the cursor row with a keyset predicate in WHERE
 
-def having_cursor_at(statement, values, sort, cursor):
+    Sort keys are compared as columns, or by repeating the expression
+    for computed keys like distance and search_score. The leading key
+    is also bounded on its own so an index on it can serve the range.
+    """
     if sort and cursor:
         payload = urlsafe_b64_json_decode(cursor)
-        params = [(field, payload.get(field)) for field in sort.keys()]
-        params = [(field, value) for field, value in params if value]
+        field_set = set(table_fields)
+        keys = []
+        for field, order in sort.items():
+            value = payload.get(field)
+            if field in field_set and value:
+                expression, values = query.computed.get(field, (field, []))
+                keys.append((expression, values, value, order == -1))
         condition = ""
         condition_values = []
-        for field, value in params[::-1]:
-            operator = "<" if sort.get(field) == -1 else ">"
+        for expression, values, value, is_desc in keys[::-1]:
+            operator = "<" if is_desc else ">"
             if not condition:
-                condition = f"{field} {operator} %s"
-                condition_values.append(value)
+                condition = f"{expression} {operator} %s"
+                condition_values = [*values, value]
             else:
-                condition = f"({field} {operator} %s OR ({field} = %s AND {condition}))"
-                condition_values = [value, value] + condition_values
-        statement = f"{statement} HAVING {condition}"
-        values.extend(condition_values)
-    return statement
+                condition = f"({expression} {operator} %s OR ({expression} = %s AND {condition}))"
+                condition_values = [*values, value, *values, value, *condition_values]
+        if condition:
+            expression, values, value, is_desc = keys[0]
+            operator = "<=" if is_desc else ">="
+            condition = f"{expression} {operator} %s AND {condition}"
+            query.where(condition, [*values, value, *condition_values])
+    return query
 
 
-def sort_by_fields(statement, params={}, table_fields=[]):
+def sort_by_fields(query, params={}, table_fields=[]):
     if params:
-        sort_values = []
         field_set = set(table_fields)
         for field, value in params.items():
             if field in field_set:
-                sort_values.append(f"{field} DESC" if value == -1 else field)
-        if sort_values:
-            conditions = ", ".join(sort_values)
-            return f"{statement} ORDER BY {conditions}"
-    return statement
-
-
-def limit_at(statement, limit):
-    return f"{statement} LIMIT {limit}" if limit and limit > 0 else statement
+                query.order_by(f"{field} DESC" if value == -1 else field)
+    return query
+
+
+def limit_at(query, limit):
+    if limit and limit > 0:
+        query.limit(limit)
+    return query
+
+
+def get_longitude_delta(lat, delta):
+    """Half-width in longitude of the box enclosing the circle of
+    delta degrees of arc around a point at the given latitude"""
+    if delta >= 90 - abs(lat):
+        # The circle reaches a pole and spans every longitude
+        return 180
+    ratio = math.sin(math.radians(delta)) / math.cos(math.radians(lat))
+    return math.degrees(math.asin(min(ratio, 1)))
+
+
+def get_longitude_ranges(lng, lng_delta):
+    """Longitude ranges of a box, split where it crosses the antimeridian"""
+    if lng_delta >= 180:
+        return [(-180, 180)]
+    lng_min, lng_max = lng - lng_delta, lng + lng_delta
+    if lng_min < -180:
+        return [(-180, lng_max), (lng_min + 360, 180)]
+    if lng_max > 180:
+        return [(lng_min, 180), (-180, lng_max - 360)]
+    return [(lng_min, lng_max)]
+
+
+def fetch_nearest(connection, query, lat_lng_origin, count):
+    """Fetch the rows nearest to the origin, closest first
+
+    Boxes around the origin are searched through the spatial index. The
+    latitude band spans delta degrees on each side, and the longitudes
+    are widened to enclose every point within delta degrees of arc,
+    split at the antimeridian. Delta is doubled until the farthest of
+    the nearest rows lies within that arc, so no closer row can be
+    outside of the boxes.
+    """
+    lat, lng = parse_lat_lng(lat_lng_origin)
+    delta = Constants.Lat_lng_delta.value
+    while True:
+        lat_min, lat_max = max(lat - delta, -90), min(lat + delta, 90)
+        lng_ranges = get_longitude_ranges(lng, get_longitude_delta(lat, delta))
+        rows = []
+        for lng_min, lng_max in lng_ranges:
+            box = ((lat_min, lng_min), (lat_max, lng_max))
+            nearest_query = where_location_within(query.copy(), *box)
+            nearest_query.order = ["distance", "id"]
+            nearest_query.limit(count)
+            with connection.cursor() as cursor:
+                nearest_query.execute(cursor)
+                rows.extend(cursor.fetchall())
+        if len(lng_ranges) > 1:
+            rows.sort(key=lambda row: (row["distance"], row.get("id")))
+            rows = rows[:count]
+        radius = delta * KM_PER_DEGREE
+        is_complete = len(rows) == count and rows[-1]["distance"] <= radius
+        # A band of 180 degrees around the origin covers the whole globe
+        if is_complete or delta >= 180:
+            return rows
+        delta *= 2
 
 
 def create_cursor(resources, sort, limit):
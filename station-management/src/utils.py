@@ -1,16 +1,26 @@
+from collections import OrderedDict
 from enum import Enum
 from sys import stderr
+from threading import Lock
 from base64 import (
     urlsafe_b64encode,
     urlsafe_b64decode,
 )
 from flask import request
 from geoip2.errors import GeoIP2Error
+import ipaddress
 import json
+import time
 import traceback
 
 # Internal Modules
-from src.config import geo_client
+from src.config import (
+    geo_client,
+    geo_reader,
+    GEO_CACHE_MAXSIZE,
+    GEO_CACHE_TTL,
+    GEO_CACHE_NEGATIVE_TTL,
+)
 
 
 class Constants(Enum):
@@ -18,23 +28,106 @@ class Constants(Enum):
     Lat_lng_delta = 0.125
 
 
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
 def get_client_ip_address():
     default = request.remote_addr
-    return request.environ.get("HTTP_X_FORWARDED_FOR", default)
+    forwarded_for = request.environ.get("HTTP_X_FORWARDED_FOR")
+    if forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return default
 
 
-def get_geo_data(ip_address):
-    for param in [ip_address, "me"]:
+def get_ip_prefix(ip_address):
+    """Network of the address, /24 for IPv4 and /48 for IPv6
+
+    Addresses in the same network share a location, so lookups are cached
+    per network. Private and invalid addresses resolve to None.
+    """
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except (TypeError, ValueError):
+        return None
+    if not address.is_global:
+        return None
+    prefix = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+# Geolocation by client network, "me" for the server itself
+geo_cache = TTLCache(GEO_CACHE_MAXSIZE, GEO_CACHE_TTL)
+
+
+def lookup_geo_data(ip_address):
+    lookups = []
+    if geo_reader and ip_address != "me":
+        lookups.append(geo_reader.city)
+    if geo_client:
+        lookups.append(geo_client.city)
+    for lookup in lookups:
         try:
-            data = geo_client.city(param)
+            data = lookup(ip_address)
             return {
                 "city": data.city.name,
                 "zip_code": data.postal.code,
                 "latitude": data.location.latitude,
                 "longitude": data.location.longitude,
             }
-        except GeoIP2Error:
+        except (GeoIP2Error, ValueError):
+            continue
+    return {}
+
+
+def get_geo_data(ip_address):
+    prefix = get_ip_prefix(ip_address)
+    for key, param in [(prefix, ip_address), ("me", "me")]:
+        if not key:
             continue
+        data = geo_cache.get(key)
+        if data is None:
+            data = lookup_geo_data(param)
+            ttl = GEO_CACHE_TTL if data else GEO_CACHE_NEGATIVE_TTL
+            geo_cache.set(key, data, ttl)
+        if data:
+            return data
     return {}
 
 
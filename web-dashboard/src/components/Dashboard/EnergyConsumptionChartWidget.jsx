@@ -7,15 +7,14 @@ import { apiInstance, toUrlParams, handleError } from "redux/api";
 import { selectAuthAccessToken } from "redux/auth/authSlice";
 import { selectFilterDashboardValues } from "redux/filter/dashboardSlice";
 
-const EnergyConsumptionChartWidget = ({ className = "", style = {} }) => {
+const EnergyConsumptionChartWidget = ({
+  className = "",
+  style = {},
+  timeIntervalChart = null,
+}) => {
   const token = useSelector(selectAuthAccessToken);
   const filter = useSelector(selectFilterDashboardValues);
-
-  const resource = useMemo(() => (
-    filter.viewBy === "station"
-      ? "energy-consumption-by-station"
-      : "energy-consumption-by-time-interval"
-  ), [filter.viewBy]);
+  const isByStation = filter.viewBy === "station";
 
   const params = useMemo(() => toUrlParams({
     start_date: filter.startDate,
@@ -24,31 +23,36 @@ const EnergyConsumptionChartWidget = ({ className = "", style = {} }) => {
     state: filter.state,
     country: filter.country,
     postal: filter.zipCode,
-    interval: filter.interval,
     order: filter.orderBy,
     count: filter.count,
   }), [filter]);
 
-  const [data, setData] = useState(null);
+  const [stationChart, setStationChart] = useState(null);
 
   const dispatch = useDispatch();
 
+  // Charts over time intervals are fetched together by the dashboard
   const fetchData = useCallback(async () => {
+    if (!isByStation) {
+      return;
+    }
     try {
-      const endpoint = `${StationAnalyticsAPI}/charts`;
-      const query = `${endpoint}/${resource}${params ? `?${params}` : ""}`;
+      const endpoint = `${StationAnalyticsAPI}/charts/energy-consumption-by-station`;
+      const query = `${endpoint}${params ? `?${params}` : ""}`;
       const headers = { Authorization: `Bearer ${token}` };
       const { data } = await apiInstance.get(query, { headers });
-      setData(data);
+      setStationChart(data);
     } catch (error) {
       handleError({ error, dispatch });
     }
-  }, [resource, params, token, dispatch]);
+  }, [isByStation, params, token, dispatch]);
 
   useEffect(() => {
     fetchData();
   }, [fetchData]);
 
+  const data = isByStation ? stationChart : timeIntervalChart;
+
   return (
     <ChartWidgetContainer
       className={className}
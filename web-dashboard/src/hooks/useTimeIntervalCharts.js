@@ -0,0 +1,52 @@
+import { useCallback, useEffect, useMemo, useState } from "react";
+import { useDispatch, useSelector } from "react-redux";
+
+import { StationAnalyticsAPI } from "configs";
+import { apiInstance, toUrlParams, handleError } from "redux/api";
+import { selectAuthAccessToken } from "redux/auth/authSlice";
+import { selectFilterDashboardValues } from "redux/filter/dashboardSlice";
+
+// Fetches the revenue, session count and energy consumption charts
+// over time intervals in a single request shared by their widgets
+const useTimeIntervalCharts = () => {
+  const token = useSelector(selectAuthAccessToken);
+  const filter = useSelector(selectFilterDashboardValues);
+  const isTimeInterval = filter.viewBy !== "station";
+
+  const params = useMemo(() => toUrlParams({
+    start_date: filter.startDate,
+    end_date: filter.endDate,
+    city: filter.city,
+    state: filter.state,
+    country: filter.country,
+    postal: filter.zipCode,
+    interval: filter.interval,
+  }), [filter]);
+
+  const [charts, setCharts] = useState(null);
+
+  const dispatch = useDispatch();
+
+  const fetchCharts = useCallback(async () => {
+    if (!isTimeInterval) {
+      return;
+    }
+    try {
+      const endpoint = `${StationAnalyticsAPI}/charts/metrics-by-time-interval`;
+      const query = `${endpoint}${params ? `?${params}` : ""}`;
+      const headers = { Authorization: `Bearer ${token}` };
+      const { data } = await apiInstance.get(query, { headers });
+      setCharts(data);
+    } catch (error) {
+      handleError({ error, dispatch });
+    }
+  }, [isTimeInterval, params, token, dispatch]);
+
+  useEffect(() => {
+    fetchCharts();
+  }, [fetchCharts]);
+
+  return charts;
+};
+
+export default useTimeIntervalCharts;
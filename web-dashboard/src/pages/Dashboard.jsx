@@ -17,6 +17,7 @@ import PeakTimeChartWidget from "components/Dashboard/PeakTimeChartWidget";
 import RevenueChartWidget from "components/Dashboard/RevenueChartWidget";
 import SessionCountChartWidget from "components/Dashboard/SessionCountChartWidget";
 import StationGrowthChartWidget from "components/Dashboard/StationGrowthChartWidget";
+import useTimeIntervalCharts from "hooks/useTimeIntervalCharts";
 import { selectLayoutHeaderHeight } from "redux/app/layoutSlice";
 import { selectAuthRoleIsStaff } from "redux/auth/authSlice";
 
@@ -24,6 +25,7 @@ const Dashboard = () => {
   const authIsAdmin = useSelector(selectAuthRoleIsStaff);
   const headerHeight = useSelector(selectLayoutHeaderHeight);
   const [isFilterModalOpen, setIsFilterModalOpen] = useState(false);
+  const timeIntervalCharts = useTimeIntervalCharts();
   return (
     <CCard className="flex-grow-1 border border-0 rounded-0">
       <StickyContainer style={{ top: `${headerHeight}px` }}>
@@ -37,13 +39,13 @@ const Dashboard = () => {
         xxl={{ cols: 3 }}
       >
         <CCol>
-          <SessionCountChartWidget />
+          <SessionCountChartWidget timeIntervalChart={timeIntervalCharts?.sessions_count} />
         </CCol>
         <CCol>
-          <RevenueChartWidget />
+          <RevenueChartWidget timeIntervalChart={timeIntervalCharts?.revenue} />
         </CCol>
         <CCol>
-          <EnergyConsumptionChartWidget />
+          <EnergyConsumptionChartWidget timeIntervalChart={timeIntervalCharts?.energy_consumption} />
         </CCol>
         <CCol>
           <PeakTimeChartWidget />